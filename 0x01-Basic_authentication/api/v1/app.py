@@ -4,8 +4,11 @@ Route module for the API
 """
 from os import getenv
 from api.v1.views import app_views
-from flask import Flask, jsonify, abort, request
+from flask import Flask, jsonify, abort, request, g
 from flask_cors import (CORS, cross_origin)
+from time import perf_counter
+from models import metrics
+from models.user import User
 import os
 
 
@@ -16,7 +19,8 @@ auth = getenv('AUTH_TYPE', None)
 excluded_list = [
     '/api/v1/status/',
     '/api/v1/unauthorized/',
-    '/api/v1/forbidden/']
+    '/api/v1/forbidden/',
+    '/api/v1/metrics/']
 
 if auth:
     if auth == 'basic_auth':
@@ -26,6 +30,25 @@ if auth:
         from api.v1.auth.auth import Auth
         auth = Auth()
 
+if metrics.ENABLED:
+    request_seconds = metrics.histogram(
+        'http_request_seconds', 'Time spent serving requests per route')
+
+    @app.before_request
+    def start_request_timer():
+        """Runs first at each request"""
+        g.request_start = perf_counter()
+
+    @app.after_request
+    def observe_request_time(response):
+        """Records the request latency of its route"""
+        if 'request_start' in g:
+            rule = request.url_rule.rule if request.url_rule else 'unmatched'
+            request_seconds.observe(
+                perf_counter() - g.request_start,
+                (('method', request.method), ('route', rule)))
+        return response
+
 
 @app.errorhandler(401)
 def unauthorized(error) -> str:
@@ -48,6 +71,12 @@ def not_found(error) -> str:
     return jsonify({"error": "Not found"}), 404
 
 
+@app.before_request
+def reload_users():
+    """Picks up the users saved by other processes"""
+    User.reload_if_changed()
+
+
 @app.before_request
 def beforeHandler():
     """Runs at each request"""
@@ -55,12 +84,25 @@ def beforeHandler():
         return
     if not auth.require_auth(request.path, excluded_list):
         return
-    if auth.authorization_header(request) is None:
+    authorization = auth.authorization_header(request)
+    if authorization is None:
         return abort(401)
-    if auth.current_user(request) is None:
+    start = perf_counter()
+    request.current_user = auth.request_user(request, authorization)
+    g.auth_duration = perf_counter() - start
+    if request.current_user is None:
         return abort(403)
 
 
+@app.after_request
+def auth_timing(response):
+    """Reports the time spent authenticating the request"""
+    if 'auth_duration' in g:
+        response.headers.add(
+            'Server-Timing', 'auth;dur={:.3f}'.format(g.auth_duration * 1000))
+    return response
+
+
 if __name__ == "__main__":
     host = getenv("API_HOST", "0.0.0.0")
     port = getenv("API_PORT", "5000")
@@ -1,16 +1,27 @@
 #!/usr/bin/env python3
 """BasicAuth Module"""
 from base64 import standard_b64decode
+from collections import OrderedDict
+from hashlib import sha256
+from os import getenv, urandom
+from threading import Lock
+from time import monotonic
 from typing import TypeVar
+import hmac
 from models.user import User
-from .auth import Auth
+from models.metrics import timed
+from .auth import Auth, AUTH_SECONDS
 
 
 class BasicAuth(Auth):
     """Basic auth implementation"""
     def __init__(self):
         """Initialize"""
-        pass
+        self.cache_size = int(getenv('BASIC_AUTH_CACHE_SIZE', 1024))
+        self.cache_ttl = int(getenv('BASIC_AUTH_CACHE_TTL', 60))
+        self.__cache = OrderedDict()
+        self.__cache_key = urandom(32)
+        self.__cache_lock = Lock()
 
     def extract_base64_authorization_header(
             self,
@@ -30,6 +41,7 @@ class BasicAuth(Auth):
             return None
         return authorization_header[6:]
 
+    @timed(*AUTH_SECONDS, step='decode_base64_authorization_header')
     def decode_base64_authorization_header(
             self,
             base64_authorization_header: str) -> str:
@@ -65,6 +77,7 @@ class BasicAuth(Auth):
             decoded_base64_authorization_header[:first_colon],
             decoded_base64_authorization_header[first_colon + 1:])
 
+    @timed(*AUTH_SECONDS, step='user_object_from_credentials')
     def user_object_from_credentials(
             self,
             user_email: str,
@@ -75,6 +88,9 @@ class BasicAuth(Auth):
         if user_pwd is None or not isinstance(user_pwd, str):
             return None
 
+        # unknown emails are rejected before any search
+        if not User.may_exist({'email': user_email}):
+            return None
         userList = User.search({'email': user_email})
         user = None
         if len(userList) == 0:
@@ -84,12 +100,52 @@ class BasicAuth(Auth):
                 user = checkUser
         return user
 
-    def current_user(self, request=None) -> TypeVar('User'):
+    def cached_user(self, key: bytes) -> TypeVar('User'):
+        """ Return the user verified for a header digest, if still valid """
+        if self.cache_size <= 0:
+            return None
+        with self.__cache_lock:
+            entry = self.__cache.get(key)
+            if entry is None:
+                return None
+            user_id, email, password, expires = entry
+            user = User.get(user_id)
+            # removed user, changed credentials or expired entry
+            if (user is None or user.email != email or
+                    user.password != password or expires < monotonic()):
+                del self.__cache[key]
+                return None
+            self.__cache.move_to_end(key)
+            return user
+
+    def cache_user(self, key: bytes, user: TypeVar('User')) -> None:
+        """ Remember the user verified for a header digest """
+        if self.cache_size <= 0:
+            return
+        with self.__cache_lock:
+            self.__cache[key] = (user.id, user.email, user.password,
+                                 monotonic() + self.cache_ttl)
+            self.__cache.move_to_end(key)
+            while len(self.__cache) > self.cache_size:
+                self.__cache.popitem(last=False)
+
+    @timed(*AUTH_SECONDS, step='basic_current_user')
+    def current_user(self, request=None,
+                     authorization: str = None) -> TypeVar('User'):
         """ Retrieves the User instance for a request """
-        header = self.authorization_header(request)
+        header = authorization if authorization is not None \
+            else self.authorization_header(request)
+        if header is None:
+            return None
+        key = hmac.new(self.__cache_key, header.encode(), sha256).digest()
+        user = self.cached_user(key)
+        if user is not None:
+            return user
         base64_header = self.extract_base64_authorization_header(header)
         decoded = self.decode_base64_authorization_header(base64_header)
         user_mail, passwd = self.extract_user_credentials(decoded)
         user = self.user_object_from_credentials(user_mail, passwd)
+        if user is not None:
+            self.cache_user(key, user)
 
         return user
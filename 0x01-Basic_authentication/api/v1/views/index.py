@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
-from flask import jsonify, abort
+from flask import jsonify, abort, Response
 from api.v1.views import app_views
 
 
@@ -23,9 +23,32 @@ def stats() -> str:
     from models.user import User
     stats = {}
     stats['users'] = User.count()
+    stats['email_lookups'] = User.lookup_stats()
     return jsonify(stats)
 
 
+@app_views.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics() -> str:
+    """ GET /api/v1/metrics
+    Return:
+      - latency histograms and counters in the Prometheus text format
+      - 404 if metrics are disabled
+    """
+    from models import metrics
+    from models.user import User
+    from api.v1.app import auth
+    if not metrics.ENABLED:
+        abort(404)
+    gauges = {'users': User.count()}
+    for key, value in User.lookup_stats().items():
+        gauges['email_lookups_{}'.format(key)] = value
+    if hasattr(auth, 'session_stats'):
+        for key, value in auth.session_stats().items():
+            gauges['sessions_{}'.format(key)] = value
+    return Response(metrics.expose(gauges),
+                    mimetype='text/plain; version=0.0.4')
+
+
 @app_views.route('/unauthorized', methods=['GET'], strict_slashes=False)
 def unauthorized() -> str:
     """ GET /api/v1/unauthorized
@@ -2,18 +2,85 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import abort, jsonify, request, Response, stream_with_context
 from models.user import User
+import json
+
+NDJSON_CHUNK_SIZE = 1000
+
+
+def json_response(data: bytes, status: int = 200) -> Response:
+    """ Response of already encoded JSON, as jsonify would return it
+    """
+    return Response(data + b"\n", status=status,
+                    mimetype='application/json')
+
+
+def json_list(fragments) -> bytes:
+    """ JSON list joined from encoded items
+    """
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def ndjson_lines(user_ids: list) -> bytes:
+    """ NDJSON lines of Users by ID, encoded without building them
+    """
+    return b"".join(data + b"\n" for data in User.encoded(user_ids))
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, users are ordered by ID
+      - cursor (optional): value of X-Next-Cursor of the previous page
+      - format (optional): `ndjson` to stream one User per line
     Return:
       - list of all User objects JSON represented
+      - X-Next-Cursor header if there are more users after the page
+      - 400 if limit isn't a positive integer
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+
+    ndjson = request.args.get('format') == 'ndjson'
+    if limit is None and cursor is None and not ndjson:
+        return json_response(
+            json_list(user.to_json_bytes() for user in User.all()))
+
+    if ndjson and limit is None:
+        # IDs are read by chunks as the stream goes: memory stays flat
+        def generate():
+            after = cursor
+            while True:
+                user_ids = User.page_ids(after, NDJSON_CHUNK_SIZE)
+                if len(user_ids) == 0:
+                    break
+                yield ndjson_lines(user_ids)
+                after = user_ids[-1]
+        return Response(stream_with_context(generate()),
+                        mimetype='application/x-ndjson')
+
+    user_ids = User.page_ids(cursor, None if limit is None else limit + 1)
+    next_cursor = None
+    if limit is not None and len(user_ids) > limit:
+        user_ids = user_ids[:limit]
+        next_cursor = user_ids[-1]
+    if ndjson:
+        response = Response(ndjson_lines(user_ids),
+                            mimetype='application/x-ndjson')
+    else:
+        response = json_response(json_list(User.encoded(user_ids)))
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -30,7 +97,7 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    return json_response(user.to_json_bytes())
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -83,12 +150,97 @@ def create_user() -> str:
             user.first_name = rj.get("first_name")
             user.last_name = rj.get("last_name")
             user.save()
-            return jsonify(user.to_json()), 201
+            return json_response(user.to_json_bytes(), 201)
         except Exception as e:
             error_msg = "Can't create User: {}".format(e)
     return jsonify({'error': error_msg}), 400
 
 
+def read_lines(stream, chunk_size: int = 65536):
+    """ Lines of a request stream, read by large chunks
+    """
+    rest = b""
+    for chunk in iter(lambda: stream.read(chunk_size), b""):
+        lines = (rest + chunk).split(b"\n")
+        rest = lines.pop()
+        yield from lines
+    if rest != b"":
+        yield rest
+
+
+@app_views.route('/users/bulk', methods=['POST'], strict_slashes=False)
+def bulk_users() -> str:
+    """ POST /api/v1/users/bulk
+    NDJSON body, one JSON object per line:
+      - email, password, last_name (optional), first_name (optional):
+        create a User
+      - "op": "update", id, last_name (optional), first_name (optional):
+        update a User
+      - "op": "delete", id: delete a User
+    Return:
+      - number of Users created, updated and deleted
+      - 400 with the error of each invalid line, nothing is applied then
+    """
+    created = []
+    updated = {}
+    deleted = set()
+    errors = []
+    for number, line in enumerate(read_lines(request.stream), 1):
+        if line.strip() == b"":
+            continue
+        try:
+            rj = json.loads(line)
+        except ValueError:
+            rj = None
+        if type(rj) is not dict:
+            errors.append({'line': number, 'error': "Wrong format"})
+            continue
+        op = rj.get("op", "create")
+        error_msg = None
+        if op == "create":
+            if rj.get("email", "") == "":
+                error_msg = "email missing"
+            elif rj.get("password", "") == "":
+                error_msg = "password missing"
+            else:
+                user = User()
+                user.email = rj.get("email")
+                user.password = rj.get("password")
+                user.first_name = rj.get("first_name")
+                user.last_name = rj.get("last_name")
+                created.append(user)
+        elif op in ("update", "delete"):
+            user = User.get(rj.get("id"))
+            if user is None:
+                error_msg = "User not found"
+            elif op == "delete":
+                deleted.add(user.id)
+            else:
+                # applied once all lines are valid
+                names = updated.setdefault(user.id, {})
+                for k in ("first_name", "last_name"):
+                    if rj.get(k) is not None:
+                        names[k] = rj.get(k)
+        else:
+            error_msg = "Unknown op: {}".format(op)
+        if error_msg is not None:
+            errors.append({'line': number, 'error': error_msg})
+    if len(errors) > 0:
+        return jsonify({'errors': errors}), 400
+
+    users = []
+    for user_id, names in updated.items():
+        user = User.get(user_id)
+        for k, v in names.items():
+            setattr(user, k, v)
+        users.append(user)
+    # one storage write for all the changes
+    User.bulk_apply([('put', user) for user in created + users] +
+                    [('delete', User.get(user_id)) for user_id in deleted])
+    return jsonify({'created': len(created), 'updated': len(users),
+                    'deleted': len(deleted)}), 200
+
+
 @app_views.route('/users/<user_id>', methods=['PUT'], strict_slashes=False)
 def update_user(user_id: str = None) -> str:
     """ PUT /api/v1/users/:id
@@ -119,4 +271,4 @@ def update_user(user_id: str = None) -> str:
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
     user.save()
-    return jsonify(user.to_json()), 200
+    return json_response(user.to_json_bytes())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+""" Metrics module: latency histograms in the Prometheus text format
+"""
+from bisect import bisect_left
+from functools import wraps
+from os import getenv
+from threading import Lock
+from time import perf_counter
+from typing import Callable
+
+
+ENABLED = getenv('METRICS', '') not in ('', '0')
+BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005,
+           0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+HISTOGRAMS = {}
+
+
+class Histogram():
+    """ Histogram class: observations counted per bucket and per labels
+    """
+
+    def __init__(self, name: str, documentation: str):
+        """ Initialize a Histogram instance
+        """
+        self.name = name
+        self.documentation = documentation
+        self.__series = {}
+        self.__lock = Lock()
+
+    def observe(self, value: float, labels: tuple = ()):
+        """ Count one observation
+        """
+        index = bisect_left(BUCKETS, value)
+        with self.__lock:
+            series = self.__series.get(labels)
+            if series is None:
+                # one count per bucket, then +Inf, sum and count
+                series = self.__series[labels] = [0] * (len(BUCKETS) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> str:
+        """ Prometheus text representation
+        """
+        lines = ["# HELP {} {}".format(self.name, self.documentation),
+                 "# TYPE {} histogram".format(self.name)]
+        with self.__lock:
+            all_series = [(labels, list(series))
+                          for labels, series in self.__series.items()]
+        for labels, series in sorted(all_series):
+            labels = ['{}="{}"'.format(k, v) for k, v in labels]
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), series):
+                cumulative += count
+                lines.append('{}_bucket{{{}}} {}'.format(
+                    self.name, ','.join(labels + ['le="{}"'.format(bound)]),
+                    cumulative))
+            suffix = '{' + ','.join(labels) + '}' if labels else ''
+            lines.append('{}_sum{} {}'.format(self.name, suffix, series[-2]))
+            lines.append('{}_count{} {}'.format(
+                self.name, suffix, series[-1]))
+        return '\n'.join(lines) + '\n'
+
+
+def histogram(name: str, documentation: str) -> Histogram:
+    """ Return the histogram of a name, creating it if needed
+    """
+    if HISTOGRAMS.get(name) is None:
+        HISTOGRAMS[name] = Histogram(name, documentation)
+    return HISTOGRAMS[name]
+
+
+def timed(name: str, documentation: str, **labels) -> Callable:
+    """ Decorator observing the duration of each call in a histogram,
+    the function is returned untouched when metrics are disabled
+    """
+    def decorator(function: Callable) -> Callable:
+        if not ENABLED:
+            return function
+        observe = histogram(name, documentation).observe
+        key = tuple(sorted(labels.items()))
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(perf_counter() - start, key)
+        return wrapper
+    return decorator
+
+
+def expose(gauges: dict = {}) -> str:
+    """ Prometheus text representation of all histograms and gauges
+    """
+    text = ''.join(HISTOGRAMS[name].expose() for name in sorted(HISTOGRAMS))
+    for name, value in sorted(gauges.items()):
+        text += "# TYPE {} gauge\n{} {}\n".format(name, name, value)
+    return text
@@ -2,12 +2,16 @@
 """ User module
 """
 import hashlib
-from models.base import Base
+import sys
+from models.base import Base, COMPACT_MODELS
 
 
 class User(Base):
     """ User class
     """
+    __indexes__ = ('email',)
+    if COMPACT_MODELS:
+        __slots__ = ('email', '_password', 'first_name', 'last_name')
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
@@ -17,6 +21,12 @@ class User(Base):
         self._password = kwargs.get('_password')
         self.first_name = kwargs.get('first_name')
         self.last_name = kwargs.get('last_name')
+        if COMPACT_MODELS:
+            # names repeat a lot across users: share one string each
+            if type(self.first_name) is str:
+                self.first_name = sys.intern(self.first_name)
+            if type(self.last_name) is str:
+                self.last_name = sys.intern(self.last_name)
 
     @property
     def password(self) -> str:
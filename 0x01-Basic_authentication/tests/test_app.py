@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+""" Tests of api.v1.app
+"""
+from api.v1.app import app
+from api.v1.auth.basic_auth import BasicAuth
+from base64 import b64encode
+from models.storage import storage
+from models.user import User
+from unittest.mock import patch
+import os
+import tempfile
+import unittest
+
+
+class TestAuthentication(unittest.TestCase):
+    """ Authentication of the requests
+    """
+
+    def setUp(self):
+        """ Work in an empty directory, with one user
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        User.load_from_file()
+        self.user = User(email='bob@hbtn.io')
+        self.user.password = 'pwd'
+        self.user.save()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """ Back to the original directory
+        """
+        storage.flush()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def get_me(self, **kwargs):
+        """ GET the user with basic auth, counting the reads of the
+        header
+        """
+        auth = BasicAuth()
+        with patch('api.v1.app.auth', auth), \
+                patch.object(auth, 'authorization_header',
+                             wraps=auth.authorization_header) as header:
+            response = self.client.get('/api/v1/users/' + self.user.id,
+                                       **kwargs)
+        return response, header.call_count
+
+    def test_basic_auth(self):
+        """ The Authorization header is read once
+        """
+        credentials = b64encode(b'bob@hbtn.io:pwd').decode()
+        response, headers = self.get_me(
+            headers={'Authorization': 'Basic ' + credentials})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['id'], self.user.id)
+        self.assertEqual(headers, 1)
+
+    def test_unauthenticated(self):
+        """ Requests without credentials are refused, bad ones forbidden
+        """
+        response, _ = self.get_me()
+        self.assertEqual(response.status_code, 401)
+        response, _ = self.get_me(
+            headers={'Authorization': 'Basic Ym9iOmJhZA=='})
+        self.assertEqual(response.status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" Tests of models.base
+"""
+from models.base import DATA, JSON_CACHE
+from models.storage import storage
+from models.user import User
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+
+class TestPages(unittest.TestCase):
+    """ Sorted IDs of Base.page_ids()
+    """
+
+    def setUp(self):
+        """ Work in an empty directory, without any User
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        User.load_from_file()
+
+    def tearDown(self):
+        """ Back to the original directory, once the changes made in
+        this one are written
+        """
+        storage.flush()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def assertSorted(self):
+        """ page_ids() are all the IDs, in order
+        """
+        self.assertEqual(User.page_ids(), sorted(DATA['User'].keys()))
+
+    def test_save_remove_bulk(self):
+        """ IDs follow saves, removals and bulk changes
+        """
+        users = [User(email='u{}@x.io'.format(i)) for i in range(10)]
+        for user in users:
+            user.save()
+        self.assertSorted()
+        users[3].remove()
+        users[3].save()
+        users[4].remove()
+        self.assertSorted()
+        User.bulk_create(User(email='b{}@x.io'.format(i)) for i in range(100))
+        self.assertEqual(User.count(), 109)
+        self.assertSorted()
+        User.bulk_delete(User.page_ids(limit=80))
+        self.assertEqual(User.count(), 29)
+        self.assertSorted()
+
+    def test_bulk_apply_one_write(self):
+        """ Creations, updates and removals are written at once
+        """
+        users = User.bulk_create(User(email='u{}@x.io'.format(i))
+                                 for i in range(3))
+        users[0].first_name = 'A'
+        with patch.object(storage, 'commit',
+                          wraps=storage.commit) as commit:
+            User.bulk_apply([('put', User(email='new@x.io')),
+                             ('put', users[0]), ('delete', users[1])])
+        self.assertEqual(commit.call_count, 1)
+        User.load_from_file()
+        self.assertEqual(User.count(), 3)
+        self.assertEqual(User.get(users[0].id).first_name, 'A')
+        self.assertIsNone(User.get(users[1].id))
+
+    def test_page_after_cursor(self):
+        """ Pages only hold IDs greater than the cursor
+        """
+        User.bulk_create(User(email='u{}@x.io'.format(i)) for i in range(20))
+        obj_ids = User.page_ids()
+        self.assertEqual(User.page_ids(obj_ids[4], 3), obj_ids[5:8])
+        self.assertEqual(User.page_ids(obj_ids[-1]), [])
+        self.assertEqual(len(User.page(obj_ids[9])), 10)
+
+    def test_loaded_objects_encoded(self):
+        """ Objects are encoded the same whether they are built or not
+        """
+        User(email='a@x.io', first_name='A').save()
+        obj_id = User.page_ids()[0]
+        User.load_from_file()
+        raw = list(User.encoded([obj_id]))
+        self.assertEqual(JSON_CACHE.get('User', {}), {})
+        self.assertEqual(raw, [User.get(obj_id).to_json_bytes()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+""" Tests of models.storage
+"""
+from models.storage import FileStorage, JournalStorage, WriteBehindStorage
+from models.storage import storage
+from models.user import User
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+
+class TestJournalStorage(unittest.TestCase):
+    """ JournalStorage recovery
+    """
+
+    def setUp(self):
+        """ Work in an empty directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        """ Back to the original directory, once the changes made in
+        this one are written
+        """
+        storage.flush()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    @staticmethod
+    def puts(first: int, last: int) -> list:
+        """ Records creating objects first to last - 1
+        """
+        return [{'op': 'put', 'id': str(i), 'obj': {'id': str(i)}}
+                for i in range(first, last)]
+
+    def test_torn_record_then_appends(self):
+        """ Records appended after a torn one are loaded
+        """
+        JournalStorage().append('Thing', self.puts(0, 3))
+        with open('.db_Thing.journal', 'a') as f:
+            f.write('{"op": "put", "id": "3", "ob')
+
+        storage = JournalStorage()
+        self.assertEqual(len(storage.load('Thing')), 3)
+        storage.append('Thing', self.puts(3, 6))
+        self.assertEqual(len(JournalStorage().load('Thing')), 6)
+
+    def test_torn_record_without_reload(self):
+        """ A process appending after another one crashed mid-record
+        doesn't lose its records
+        """
+        storage = JournalStorage()
+        storage.append('Thing', self.puts(0, 3))
+        with open('.db_Thing.journal', 'a') as f:
+            f.write('{"op": "put", "id": "3", "ob')
+        storage.append('Thing', self.puts(3, 6))
+        self.assertEqual(len(JournalStorage().load('Thing')), 6)
+
+    def orphan_compacting(self):
+        """ Leave a rotated journal of 3 records, as a process crashing
+        while compacting it does
+        """
+        JournalStorage().append('Thing', self.puts(0, 3))
+        os.rename('.db_Thing.journal', '.db_Thing.journal.compacting')
+
+    @staticmethod
+    def wait_compacted() -> bool:
+        """ Wait for the rotated journal to be merged
+        """
+        deadline = time.time() + 5
+        while os.path.exists('.db_Thing.journal.compacting'):
+            if time.time() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def test_orphan_compaction_resumed_on_load(self):
+        """ A rotated journal left by a crash is merged on load
+        """
+        self.orphan_compacting()
+        self.assertEqual(len(JournalStorage(3).load('Thing')), 3)
+        self.assertTrue(self.wait_compacted())
+        self.assertEqual(len(JournalStorage.read('.db_Thing.json')), 3)
+
+    def test_orphan_compaction_resumed_on_append(self):
+        """ A rotated journal left by a crash doesn't stop compactions
+        """
+        self.orphan_compacting()
+        storage = JournalStorage(3)
+        for i in range(3, 50):
+            storage.append('Thing', self.puts(i, i + 1))
+        self.assertTrue(self.wait_compacted())
+        self.assertEqual(len(JournalStorage().load('Thing')), 50)
+        # the last append may have rotated the journal away
+        if os.path.exists('.db_Thing.journal'):
+            with open('.db_Thing.journal') as f:
+                self.assertLess(len(f.readlines()), 3 + 1)
+
+    def test_running_compaction_not_resumed(self):
+        """ A rotated journal being compacted isn't taken over
+        """
+        self.orphan_compacting()
+        lock_file = JournalStorage().compaction_lock('Thing')
+        try:
+            JournalStorage(3).load('Thing')
+            time.sleep(0.1)
+            self.assertTrue(os.path.exists('.db_Thing.journal.compacting'))
+        finally:
+            lock_file.close()
+
+
+class TestWriteBehindStorage(unittest.TestCase):
+    """ WriteBehindStorage reads and writes its pending changes
+    """
+
+    def setUp(self):
+        """ Work in an empty directory, with changes that are only ever
+        written when flushed explicitly
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.storage = WriteBehindStorage(FileStorage(), flush_interval=3600)
+        self.patch = patch('models.base.storage', self.storage)
+        self.patch.start()
+        User.load_from_file()
+
+    def tearDown(self):
+        """ Back to the original directory
+        """
+        self.storage.flush()
+        self.patch.stop()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_load_pending(self):
+        """ Objects saved but not written yet are loaded
+        """
+        user = User(email='pending@hbtn.io')
+        user.save()
+        self.assertFalse(os.path.exists('.db_User.json'))
+        User.load_from_file()
+        self.assertEqual(User.get(user.id).email, 'pending@hbtn.io')
+        self.assertEqual(self.storage.flush(), 0)
+
+    def test_dump_after_pending(self):
+        """ Pending changes don't overwrite a later dump
+        """
+        user = User(email='removed@hbtn.io')
+        user.save()
+        user.remove()
+        kept = User(email='kept@hbtn.io')
+        kept.save()
+        User.save_to_file()
+        self.assertEqual(self.storage.flush(), 0)
+        User.load_from_file()
+        self.assertIsNone(User.get(user.id))
+        self.assertEqual(User.get(kept.id).email, 'kept@hbtn.io')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,34 @@
 #!/usr/bin/env python3
 """Authentication Module"""
-from flask import request
-from re import match
+from flask import g, request
+from functools import lru_cache
+import re
 from os import getenv
-from typing import List, TypeVar
+from typing import Callable, List, Tuple, TypeVar
+
+AUTH_SECONDS = ('auth_seconds', 'Time spent in authentication steps')
+
+
+@lru_cache(maxsize=16)
+def excluded_paths_matcher(
+        exclude_paths: Tuple[str, ...]) -> Callable[[str], bool]:
+    """Compile excluded paths into one matcher, memoized per path.
+
+    Paths match with or without trailing slash, a path ending with `*`
+    matches every path starting with what precedes the `*`.
+    """
+    patterns = []
+    for excluded in exclude_paths:
+        if excluded.endswith('*'):
+            patterns.append(re.escape(excluded[:-1]) + '.*')
+        else:
+            patterns.append(re.escape(excluded.rstrip('/')) + '/?')
+    regex = re.compile('|'.join(patterns), re.DOTALL)
+
+    @lru_cache(maxsize=1024)
+    def is_excluded(path: str) -> bool:
+        return regex.fullmatch(path) is not None
+    return is_excluded
 
 
 class Auth:
@@ -19,12 +44,7 @@ class Auth:
                 len(exclude_paths) == 0):
             return True
 
-        mod_path = path if match(r'/api/v1/[A-Za-z]*/$', path) \
-            else path + '/'
-        if mod_path in exclude_paths:
-            return False
-        else:
-            return True
+        return not excluded_paths_matcher(tuple(exclude_paths))(path)
 
     def authorization_header(self, request=None) -> str:
         """Flask request object"""
@@ -36,10 +56,19 @@ class Auth:
         else:
             return None
 
-    def current_user(self, request=None) -> TypeVar('User'):
-        """Return the current user"""
+    def current_user(self, request=None, authorization: str = None,
+                     cookie: str = None) -> TypeVar('User'):
+        """Return the current user; authorization and cookie, when
+        given, are the already read header and session cookie"""
         return None
 
+    def request_user(self, request=None, authorization: str = None,
+                     cookie: str = None) -> TypeVar('User'):
+        """Return the current user, resolved once per request on flask.g"""
+        if 'current_user' not in g:
+            g.current_user = self.current_user(request, authorization, cookie)
+        return g.current_user
+
     def session_cookie(self, request=None):
         """ Retrieve cookie """
         if request is None:
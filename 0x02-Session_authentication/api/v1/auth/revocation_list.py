@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+""" Revocation list of signed session tokens """
+from contextlib import contextmanager
+from os import getenv, path
+from threading import Lock
+from time import time
+import fcntl
+import mmap
+import struct
+from models.bloom_filter import BloomFilter
+
+
+class RevocationList:
+    """ Keys revoked during the last two periods: two Bloom filters, the
+    older one being cleared and reused every period. A key revoked at t
+    is kept until t + period at least, so the period must be at least the
+    lifetime of what is revoked. Kept in a memory mapped file shared by
+    all processes mapping it, or in anonymous memory without file_path """
+    HEADER = struct.Struct('<Bd')
+
+    def __init__(self, file_path: str = None, period: float = 86400,
+                 capacity: int = 100000, error_rate: float = 0.001):
+        """ Initialize """
+        self.period = period
+        filter_size = BloomFilter.byte_size(capacity, error_rate)
+        size = self.HEADER.size + 2 * filter_size
+        self.__lock = Lock()
+        self.__file = None
+        if file_path is None:
+            self.__map = mmap.mmap(-1, size)
+        else:
+            self.__file = open(file_path, 'a+b')
+            fcntl.flock(self.__file, fcntl.LOCK_EX)
+            try:
+                if path.getsize(file_path) != size:
+                    # new file or other sizing: start empty
+                    self.__file.truncate(0)
+                    self.__file.truncate(size)
+            finally:
+                fcntl.flock(self.__file, fcntl.LOCK_UN)
+            self.__map = mmap.mmap(self.__file.fileno(), size)
+        self.__filters = [
+            BloomFilter(capacity, error_rate, memoryview(self.__map)[
+                self.HEADER.size + i * filter_size:
+                self.HEADER.size + (i + 1) * filter_size])
+            for i in range(2)]
+
+    @contextmanager
+    def __locked(self, operation: int):
+        """ Lock the filters against other threads and processes """
+        with self.__lock:
+            if self.__file is None:
+                yield
+                return
+            fcntl.flock(self.__file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.__file, fcntl.LOCK_UN)
+
+    def add(self, key) -> None:
+        """ Revoke a key """
+        now = time()
+        with self.__locked(fcntl.LOCK_EX):
+            current, started_at = self.HEADER.unpack_from(self.__map)
+            if now - started_at >= self.period:
+                if started_at > 0:
+                    # the keys of the older filter outlived their period
+                    current = 1 - current
+                    self.__filters[current].clear()
+                self.HEADER.pack_into(self.__map, 0, current, now)
+            self.__filters[current].add(key)
+
+    def __contains__(self, key) -> bool:
+        """ False if the key wasn't revoked, True if it probably was """
+        with self.__locked(fcntl.LOCK_SH):
+            return any(key in bloom_filter for bloom_filter in self.__filters)
+
+    def stats(self) -> dict:
+        """ Memory used and estimated false positive rate """
+        with self.__locked(fcntl.LOCK_SH):
+            rates = [f.false_positive_rate() for f in self.__filters]
+        return {
+            'revocation_bytes': len(self.__map),
+            'revocation_false_positive_rate':
+                1 - (1 - rates[0]) * (1 - rates[1]),
+        }
+
+
+def revocation_list_from_env(period: float) -> RevocationList:
+    """ RevocationList configured by SESSION_REVOCATION_PATH and
+    SESSION_REVOCATION_CAPACITY """
+    return RevocationList(
+        getenv('SESSION_REVOCATION_PATH', '.sessions.revoked') or None,
+        period, int(getenv('SESSION_REVOCATION_CAPACITY', 100000)))
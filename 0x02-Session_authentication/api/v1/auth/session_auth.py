@@ -1,39 +1,144 @@
 #!/usr/bin/env python3
 """ Session Authentication"""
+from os import getenv
+from threading import Thread
+from time import sleep, time
 from uuid import uuid4
-from .auth import Auth
+from models.metrics import timed
+from .auth import Auth, AUTH_SECONDS
+from .session_store import SessionStoreFull, session_store_from_env
+from .timer_wheel import TimerWheel
 from models.user import User
 
 
 class SessionAuth(Auth):
     """Session Authentication class"""
-    user_id_by_session_id = {}
+    user_id_by_session_id = session_store_from_env()
 
+    def __init__(self):
+        """ Initialize: start the reaper if sessions expire """
+        self.session_duration = int(getenv('SESSION_DURATION', 0))
+        self.session_idle_duration = int(getenv('SESSION_IDLE_DURATION', 0))
+        self.sweep_batch = int(getenv('SESSION_SWEEP_BATCH', 1024))
+        self.reaped_sessions = 0
+        self.reaper = None
+        if self.session_duration > 0 or self.session_idle_duration > 0:
+            if self.user_id_by_session_id.shared:
+                # sessions of other processes, running or gone, too
+                Thread(target=self.sweep_forever, daemon=True).start()
+            else:
+                self.reaper = TimerWheel(time())
+                Thread(target=self.reap_forever, daemon=True).start()
+
+    def session_deadline(self, created_at: float,
+                         accessed_at: float) -> float:
+        """ Expiry time of a session, None if it never expires """
+        deadlines = []
+        if self.session_duration > 0:
+            deadlines.append(created_at + self.session_duration)
+        if self.session_idle_duration > 0:
+            deadlines.append(accessed_at + self.session_idle_duration)
+        return min(deadlines) if deadlines else None
+
+    @timed(*AUTH_SECONDS, step='create_session')
     def create_session(self, user_id: str = None) -> str:
-        """ Create a new session id"""
+        """ Create a new session id, None if the store is full"""
         if user_id is None or not isinstance(user_id, str):
             return None
         session_id = str(uuid4())
-        self.user_id_by_session_id[session_id] = user_id
+        now = time()
+        try:
+            self.user_id_by_session_id.set(session_id, user_id, now)
+        except SessionStoreFull:
+            return None
+        if self.reaper is not None:
+            self.reaper.schedule(session_id, self.session_deadline(now, now))
 
         return session_id
 
+    @timed(*AUTH_SECONDS, step='user_id_for_session_id')
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """ Retrieve the user_id based on the session_id. """
         if session_id is None or not isinstance(session_id, str):
             return None
+        record = self.user_id_by_session_id.get_record(session_id)
+        if record is None:
+            return None
+        user_id, created_at, accessed_at = record
+        deadline = self.session_deadline(created_at, accessed_at)
+        if deadline is None:
+            return user_id
+
+        now = time()
+        if deadline <= now:
+            self.user_id_by_session_id.delete(session_id)
+            return None
+        # sub-second accesses don't move an idle deadline in practice
+        if self.session_idle_duration > 0 and now - accessed_at >= 1:
+            self.user_id_by_session_id.touch(session_id, now)
+        return user_id
+
+    def reap(self, now: float) -> int:
+        """ Delete the sessions expired at now, return their number """
+        reaped = 0
+        for session_id in self.reaper.advance(now):
+            record = self.user_id_by_session_id.get_record(session_id)
+            if record is None:
+                continue
+            deadline = self.session_deadline(record[1], record[2])
+            if deadline > now:
+                # accessed since it was scheduled
+                self.reaper.schedule(session_id, deadline)
+            elif self.user_id_by_session_id.delete(session_id):
+                reaped += 1
+        self.reaped_sessions += reaped
+        return reaped
+
+    def reap_forever(self) -> None:
+        """ Reaper thread loop """
+        while True:
+            sleep(self.reaper.resolution)
+            self.reap(time())
 
-        return self.user_id_by_session_id.get(session_id)
+    def sweep(self, now: float) -> int:
+        """ Delete a batch of the sessions of the store expired at now,
+        return their number """
+        reaped = self.user_id_by_session_id.expire(
+            now - self.session_duration if self.session_duration > 0
+            else None,
+            now - self.session_idle_duration if self.session_idle_duration > 0
+            else None,
+            self.sweep_batch)
+        self.reaped_sessions += reaped
+        return reaped
 
-    def current_user(self, request=None):
+    def sweep_forever(self) -> None:
+        """ Sweeper thread loop: a batch per second, more while batches
+        are full of expired sessions """
+        while True:
+            if self.sweep(time()) < self.sweep_batch:
+                sleep(1)
+
+    def session_stats(self) -> dict:
+        """ Live and reaped session counts """
+        return {
+            'live': len(self.user_id_by_session_id),
+            'reaped': self.reaped_sessions,
+        }
+
+    @timed(*AUTH_SECONDS, step='session_current_user')
+    def current_user(self, request=None, authorization: str = None,
+                     cookie: str = None):
         """ Return the current user"""
-        if request is None:
-            return None
-        cookie = self.session_cookie(request)
+        if cookie is None:
+            if request is None:
+                return None
+            cookie = self.session_cookie(request)
         user_id = self.user_id_for_session_id(cookie)
 
         return User.get(user_id)
 
+    @timed(*AUTH_SECONDS, step='destroy_session')
     def destroy_session(self, request=None):
         """ Deletes the user session / logout """
         if request is None:
@@ -41,8 +146,4 @@ class SessionAuth(Auth):
         cookie = self.session_cookie(request)
         if cookie is None:
             return False
-        user_id = self.user_id_for_session_id(cookie)
-        if user_id is None:
-            return False
-        del self.user_id_by_session_id[cookie]
-        return True
+        return self.user_id_by_session_id.delete(cookie)
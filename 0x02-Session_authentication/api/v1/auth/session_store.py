@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+""" Session stores: where SessionAuth keeps session_id -> user_id """
+from contextlib import contextmanager
+from hashlib import blake2b
+from os import getenv, getpid, path
+from threading import Lock, local
+from time import time
+import fcntl
+import mmap
+import sqlite3
+import struct
+
+
+class SessionStore:
+    """ SessionStore interface, usable like a dict """
+    # whether several processes see the same sessions
+    shared = False
+
+    def get_record(self, session_id: str) -> tuple:
+        """ Return (user_id, created_at, accessed_at) of a session """
+        raise NotImplementedError()
+
+    def set(self, session_id: str, user_id: str,
+            created_at: float = None) -> None:
+        """ Store the user_id of a session """
+        raise NotImplementedError()
+
+    def touch(self, session_id: str, accessed_at: float = None) -> None:
+        """ Update the last access time of a session """
+        raise NotImplementedError()
+
+    def delete(self, session_id: str) -> bool:
+        """ Delete a session, return False if it doesn't exist """
+        raise NotImplementedError()
+
+    def expire(self, created_before: float = None,
+               accessed_before: float = None, batch: int = 1024) -> int:
+        """ Delete sessions created before created_before or last accessed
+        before accessed_before (None: no such bound), looking at a bounded
+        batch of them, return the number deleted """
+        raise NotImplementedError()
+
+    def get(self, session_id: str, default=None) -> str:
+        """ Return the user_id of a session """
+        record = self.get_record(session_id)
+        return default if record is None else record[0]
+
+    def __getitem__(self, session_id: str) -> str:
+        """ store[session_id] """
+        user_id = self.get(session_id)
+        if user_id is None:
+            raise KeyError(session_id)
+        return user_id
+
+    def __setitem__(self, session_id: str, user_id: str) -> None:
+        """ store[session_id] = user_id """
+        self.set(session_id, user_id)
+
+    def __delitem__(self, session_id: str) -> None:
+        """ del store[session_id] """
+        if not self.delete(session_id):
+            raise KeyError(session_id)
+
+    def __contains__(self, session_id: str) -> bool:
+        """ session_id in store """
+        return self.get(session_id) is not None
+
+
+class MemorySessionStore(SessionStore):
+    """ Sessions in a dict of the current process """
+
+    def __init__(self):
+        """ Initialize """
+        self.__sessions = {}
+
+    def get_record(self, session_id: str) -> tuple:
+        """ Return (user_id, created_at, accessed_at) of a session """
+        return self.__sessions.get(session_id)
+
+    def set(self, session_id: str, user_id: str,
+            created_at: float = None) -> None:
+        """ Store the user_id of a session """
+        created_at = time() if created_at is None else created_at
+        self.__sessions[session_id] = (user_id, created_at, created_at)
+
+    def touch(self, session_id: str, accessed_at: float = None) -> None:
+        """ Update the last access time of a session """
+        record = self.__sessions.get(session_id)
+        if record is not None:
+            accessed_at = time() if accessed_at is None else accessed_at
+            self.__sessions[session_id] = (record[0], record[1], accessed_at)
+
+    def delete(self, session_id: str) -> bool:
+        """ Delete a session, return False if it doesn't exist """
+        return self.__sessions.pop(session_id, None) is not None
+
+    def expire(self, created_before: float = None,
+               accessed_before: float = None, batch: int = 1024) -> int:
+        """ Delete at most batch expired sessions, return the number
+        deleted """
+        created_before = float('-inf') if created_before is None \
+            else created_before
+        accessed_before = float('-inf') if accessed_before is None \
+            else accessed_before
+        expired = 0
+        # other threads may add sessions meanwhile: iterate over a copy
+        for session_id, record in list(self.__sessions.items()):
+            if expired >= batch:
+                break
+            if record[1] < created_before or record[2] < accessed_before:
+                if self.delete(session_id):
+                    expired += 1
+        return expired
+
+    def __len__(self) -> int:
+        """ Number of sessions """
+        return len(self.__sessions)
+
+
+class SessionStoreFull(ValueError):
+    """ Raised when a store has no room for another session """
+
+
+class MmapSessionStore(SessionStore):
+    """ Sessions in a fixed-size, open addressing hash table in a memory
+    mapped file, shared by all processes mapping the same file. Linear
+    probing with backward shift deletion: no tombstones, and at most
+    max_load of the slots are used, so every probe ends on an empty slot
+    """
+    EMPTY, USED = 0, 1
+    shared = True
+    HEADER = struct.Struct('<8sQ')
+    MAGIC = b'SESSMAP2'
+    SLOT = struct.Struct('<B64p64pdd')
+
+    def __init__(self, file_path: str, capacity: int = 65536,
+                 max_load: float = 0.9):
+        """ Initialize """
+        self.file_path = file_path
+        self.capacity = capacity
+        self.max_used = max(1, int(capacity * max_load))
+        self.size = self.HEADER.size + capacity * self.SLOT.size
+        self.__pid = None
+        self.__open_lock = Lock()
+        # next slot looked at by expire()
+        self.__sweep_at = 0
+
+    def __open(self):
+        """ Open and map the file in the current process: a file
+        inherited through fork would share its flock with the parent """
+        pid = getpid()
+        if self.__pid == pid:
+            return
+        with self.__open_lock:
+            if self.__pid != pid:
+                self.__map_file()
+                self.__pid = pid
+
+    def __map_file(self):
+        """ Open, check and map the file """
+        self.__lock = Lock()
+        self.__file = open(self.file_path, 'a+b')
+        fcntl.flock(self.__file, fcntl.LOCK_EX)
+        try:
+            self.__map = mmap.mmap(self.__file.fileno(), 0) \
+                if path.getsize(self.file_path) == self.size else None
+            if self.__map is None or \
+                    self.HEADER.unpack_from(self.__map)[0] != self.MAGIC:
+                # new file, other sizing or older layout: start empty
+                if self.__map is not None:
+                    self.__map.close()
+                self.__file.truncate(0)
+                self.__file.truncate(self.size)
+                self.__map = mmap.mmap(self.__file.fileno(), self.size)
+                self.HEADER.pack_into(self.__map, 0, self.MAGIC, 0)
+        finally:
+            fcntl.flock(self.__file, fcntl.LOCK_UN)
+
+    def __home(self, key: bytes) -> int:
+        """ First slot index of the probe sequence of a key """
+        # python's hash() is salted per process: use a stable one
+        digest = blake2b(key, digest_size=8).digest()
+        return int.from_bytes(digest, 'little') % self.capacity
+
+    def __slot(self, index: int) -> tuple:
+        """ Content of a slot """
+        return self.SLOT.unpack_from(
+            self.__map, self.HEADER.size + index * self.SLOT.size)
+
+    def __write(self, index: int, *slot) -> None:
+        """ Write the content of a slot """
+        self.SLOT.pack_into(
+            self.__map, self.HEADER.size + index * self.SLOT.size, *slot)
+
+    def __used(self, delta: int = 0) -> int:
+        """ Number of used slots, after adding delta to it """
+        magic, used = self.HEADER.unpack_from(self.__map)
+        if delta != 0:
+            used += delta
+            self.HEADER.pack_into(self.__map, 0, magic, used)
+        return used
+
+    @contextmanager
+    def __locked(self, operation: int):
+        """ Lock the table against other threads and processes """
+        self.__open()
+        with self.__lock:
+            fcntl.flock(self.__file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(self.__file, fcntl.LOCK_UN)
+
+    def __find(self, key: bytes) -> tuple:
+        """ Return (index, slot) of the used slot of a key, or (index of
+        the empty slot ending its probe sequence, None) """
+        index = self.__home(key)
+        while True:
+            slot = self.__slot(index)
+            if slot[0] != self.USED:
+                return index, None
+            if slot[1] == key:
+                return index, slot
+            index = (index + 1) % self.capacity
+
+    def get_record(self, session_id: str) -> tuple:
+        """ Return (user_id, created_at, accessed_at) of a session """
+        if session_id is None:
+            return None
+        with self.__locked(fcntl.LOCK_SH):
+            index, slot = self.__find(session_id.encode())
+        if slot is None:
+            return None
+        return (slot[2].decode(), slot[3], slot[4])
+
+    def set(self, session_id: str, user_id: str,
+            created_at: float = None) -> None:
+        """ Store the user_id of a session """
+        key, value = session_id.encode(), user_id.encode()
+        if len(key) > 63 or len(value) > 63:
+            raise ValueError("session_id and user_id are limited to 63 bytes")
+        created_at = time() if created_at is None else created_at
+        with self.__locked(fcntl.LOCK_EX):
+            index, slot = self.__find(key)
+            if slot is None:
+                if self.__used() >= self.max_used:
+                    raise SessionStoreFull("session store is full")
+                self.__used(1)
+            self.__write(index, self.USED, key, value, created_at, created_at)
+
+    def touch(self, session_id: str, accessed_at: float = None) -> None:
+        """ Update the last access time of a session """
+        accessed_at = time() if accessed_at is None else accessed_at
+        with self.__locked(fcntl.LOCK_EX):
+            index, slot = self.__find(session_id.encode())
+            if slot is not None:
+                self.__write(index, *slot[:4], accessed_at)
+
+    def __remove(self, index: int) -> None:
+        """ Empty a used slot, moving back the following slots of the
+        cluster that would no longer be reachable; lock held """
+        capacity = self.capacity
+        following = index
+        while True:
+            following = (following + 1) % capacity
+            slot = self.__slot(following)
+            if slot[0] != self.USED:
+                break
+            # distances from the home slot of the moved key
+            home = self.__home(slot[1])
+            if (following - home) % capacity >= (following - index) % capacity:
+                self.__write(index, *slot)
+                index = following
+        self.__write(index, self.EMPTY, b'', b'', 0, 0)
+        self.__used(-1)
+
+    def delete(self, session_id: str) -> bool:
+        """ Delete a session, return False if it doesn't exist """
+        with self.__locked(fcntl.LOCK_EX):
+            index, slot = self.__find(session_id.encode())
+            if slot is None:
+                return False
+            self.__remove(index)
+        return True
+
+    def expire(self, created_before: float = None,
+               accessed_before: float = None, batch: int = 1024) -> int:
+        """ Delete expired sessions among the next batch of slots, return
+        the number deleted: successive calls sweep the whole table """
+        if created_before is None and accessed_before is None:
+            return 0
+        created_before = created_before or float('-inf')
+        accessed_before = accessed_before or float('-inf')
+        expired = 0
+        with self.__locked(fcntl.LOCK_EX):
+            index = self.__sweep_at % self.capacity
+            for _ in range(min(batch, self.capacity)):
+                slot = self.__slot(index)
+                if slot[0] == self.USED and (slot[3] < created_before or
+                                             slot[4] < accessed_before):
+                    # the next slot of the cluster may move in: look again
+                    self.__remove(index)
+                    expired += 1
+                else:
+                    index = (index + 1) % self.capacity
+            self.__sweep_at = index
+        return expired
+
+    def __len__(self) -> int:
+        """ Number of sessions """
+        with self.__locked(fcntl.LOCK_SH):
+            return self.__used()
+
+
+class SQLiteSessionStore(SessionStore):
+    """ Sessions in a SQLite database in WAL mode, shared by all processes
+    opening the same file """
+    shared = True
+
+    def __init__(self, file_path: str, timeout: float = 5.0):
+        """ Initialize """
+        self.file_path = file_path
+        self.timeout = timeout
+        self.__local = local()
+        self.__connection().execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+        for column in ('created_at', 'accessed_at'):
+            self.__connection().execute(
+                "CREATE INDEX IF NOT EXISTS sessions_{0} "
+                "ON sessions ({0})".format(column))
+
+    def __connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread """
+        connection = getattr(self.__local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.file_path,
+                                         timeout=self.timeout,
+                                         isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.__local.connection = connection
+        return connection
+
+    def get_record(self, session_id: str) -> tuple:
+        """ Return (user_id, created_at, accessed_at) of a session """
+        return self.__connection().execute(
+            "SELECT user_id, created_at, accessed_at FROM sessions "
+            "WHERE session_id = ?", (session_id,)).fetchone()
+
+    def set(self, session_id: str, user_id: str,
+            created_at: float = None) -> None:
+        """ Store the user_id of a session """
+        created_at = time() if created_at is None else created_at
+        self.__connection().execute(
+            "INSERT OR REPLACE INTO sessions "
+            "(session_id, user_id, created_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (session_id, user_id, created_at, created_at))
+
+    def touch(self, session_id: str, accessed_at: float = None) -> None:
+        """ Update the last access time of a session """
+        accessed_at = time() if accessed_at is None else accessed_at
+        self.__connection().execute(
+            "UPDATE sessions SET accessed_at = ? WHERE session_id = ?",
+            (accessed_at, session_id))
+
+    def delete(self, session_id: str) -> bool:
+        """ Delete a session, return False if it doesn't exist """
+        cursor = self.__connection().execute(
+            "DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def expire(self, created_before: float = None,
+               accessed_before: float = None, batch: int = 1024) -> int:
+        """ Delete at most batch expired sessions, found through the
+        indexes, return the number deleted """
+        conditions, parameters = [], []
+        if created_before is not None:
+            conditions.append("created_at < ?")
+            parameters.append(created_before)
+        if accessed_before is not None:
+            conditions.append("accessed_at < ?")
+            parameters.append(accessed_before)
+        if len(conditions) == 0:
+            return 0
+        cursor = self.__connection().execute(
+            "DELETE FROM sessions WHERE rowid IN (SELECT rowid FROM sessions "
+            "WHERE {} LIMIT ?)".format(" OR ".join(conditions)),
+            parameters + [batch])
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        """ Number of sessions """
+        return self.__connection().execute(
+            "SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def session_store_from_env() -> SessionStore:
+    """ Build the session store selected by SESSION_STORE """
+    store_type = getenv('SESSION_STORE', 'memory')
+    if store_type == 'mmap':
+        return MmapSessionStore(
+            getenv('SESSION_STORE_PATH', '.sessions.mmap'),
+            int(getenv('SESSION_STORE_CAPACITY', 65536)))
+    if store_type == 'sqlite':
+        return SQLiteSessionStore(
+            getenv('SESSION_STORE_PATH', '.sessions.db'))
+    return MemorySessionStore()
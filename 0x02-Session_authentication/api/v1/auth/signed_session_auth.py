@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+""" Signed Session Authentication"""
+from base64 import urlsafe_b64encode
+from hashlib import sha256
+from os import getenv, urandom
+from secrets import token_hex
+from time import time
+import hmac
+from models.metrics import timed
+from .auth import AUTH_SECONDS
+from .revocation_list import revocation_list_from_env
+from .session_auth import SessionAuth
+
+
+class SignedSessionAuth(SessionAuth):
+    """Session Authentication with stateless session ids:
+    `<user_id>.<expires_at>.<nonce>.<HMAC-SHA256 signature>`, checked
+    without any store, revoked through a revocation list"""
+
+    def __init__(self):
+        """ Initialize: signing key and revocation list """
+        secret = getenv('SESSION_SECRET')
+        # without a shared secret, sessions only work in this process
+        self.secret = secret.encode() if secret else urandom(32)
+        # a stateless session can't track idle time: it must expire
+        self.session_duration = int(getenv('SESSION_DURATION', 0)) or 86400
+        self.session_idle_duration = 0
+        self.reaped_sessions = 0
+        self.reaper = None
+        self.revoked = revocation_list_from_env(self.session_duration)
+
+    def signature(self, payload: str) -> str:
+        """ HMAC of a session id payload """
+        digest = hmac.new(self.secret, payload.encode(), sha256).digest()
+        return urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    @timed(*AUTH_SECONDS, step='create_session')
+    def create_session(self, user_id: str = None) -> str:
+        """ Create a new session id"""
+        if user_id is None or not isinstance(user_id, str):
+            return None
+        payload = "{}.{}.{}".format(
+            user_id, int(time()) + self.session_duration, token_hex(8))
+        return "{}.{}".format(payload, self.signature(payload))
+
+    @timed(*AUTH_SECONDS, step='user_id_for_session_id')
+    def user_id_for_session_id(self, session_id: str = None) -> str:
+        """ Retrieve the user_id of a valid, unexpired, unrevoked
+        session_id """
+        if session_id is None or not isinstance(session_id, str):
+            return None
+        # compare_digest() only takes ASCII strings
+        if not session_id.isascii():
+            return None
+        payload, _, signature = session_id.rpartition('.')
+        if not hmac.compare_digest(signature, self.signature(payload)):
+            return None
+        fields = payload.rsplit('.', 2)
+        if len(fields) != 3 or not fields[1].isdigit():
+            return None
+        user_id, expires_at, _ = fields
+        if int(expires_at) <= time() or signature in self.revoked:
+            return None
+        return user_id
+
+    def session_stats(self) -> dict:
+        """ Revocation list size and false positive rate """
+        return self.revoked.stats()
+
+    @timed(*AUTH_SECONDS, step='destroy_session')
+    def destroy_session(self, request=None):
+        """ Revokes the user session / logout """
+        if request is None:
+            return False
+        cookie = self.session_cookie(request)
+        if self.user_id_for_session_id(cookie) is None:
+            return False
+        self.revoked.add(cookie.rpartition('.')[2])
+        return True
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+""" Timer wheel module """
+from math import ceil
+from threading import Lock
+from typing import Hashable, List
+
+
+class TimerWheel:
+    """ Hashed timer wheel: keys are put in the bucket of the tick of
+    their deadline, scheduling is O(1) and advancing only visits the
+    buckets of elapsed ticks and the keys they hold """
+
+    def __init__(self, now: float, resolution: float = 1.0):
+        """ Initialize """
+        self.resolution = resolution
+        self.__current = int(now // resolution)
+        self.__buckets = {}
+        self.__lock = Lock()
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """ Schedule a key to expire at a deadline """
+        with self.__lock:
+            tick = max(ceil(deadline / self.resolution), self.__current + 1)
+            self.__buckets.setdefault(tick, []).append(key)
+
+    def advance(self, now: float) -> List[Hashable]:
+        """ Move the wheel to now, return the keys that expired """
+        expired = []
+        with self.__lock:
+            target = int(now // self.resolution)
+            for tick in range(self.__current + 1, target + 1):
+                expired.extend(self.__buckets.pop(tick, ()))
+            self.__current = max(self.__current, target)
+        return expired
+
+    def __len__(self) -> int:
+        """ Number of scheduled keys """
+        with self.__lock:
+            return sum(len(keys) for keys in self.__buckets.values())
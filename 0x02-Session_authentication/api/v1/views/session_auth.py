@@ -1,10 +1,15 @@
 #!/usr/bin/env python3
 """ Session authenticated view"""
 from flask import jsonify, abort, request
+from math import ceil
 from os import getenv
+from api.v1.auth.login_throttle import login_throttle_from_env
 from api.v1.views import app_views
+from api.v1.views.users import json_response
 from models.user import User
 
+login_throttle = login_throttle_from_env()
+
 
 @app_views.route(
         '/auth_session/login/',
@@ -20,6 +25,16 @@ def login():
     if password is None:
         return jsonify({"error": "password missing"}), 400
 
+    # throttled before any search or password hashing
+    wait = login_throttle.attempt(request.remote_addr, email)
+    if wait > 0:
+        response = jsonify({"error": "too many login attempts"})
+        response.headers['Retry-After'] = str(ceil(wait))
+        return response, 429
+
+    # unknown emails are rejected before any search
+    if not User.may_exist({'email': email}):
+        return jsonify({"error": "no user found for this email"}), 404
     userList = User.search({'email': email})
     user = None
     if len(userList) == 0:
@@ -32,12 +47,15 @@ def login():
 
     if user is None:
         return jsonify({"error": "wrong password"}), 401
+    login_throttle.succeeded(request.remote_addr, email)
 
     from api.v1.app import auth
     session_id = auth.create_session(user.id)
+    if session_id is None:
+        return jsonify({"error": "too many sessions"}), 503
     cookie_name = getenv('SESSION_NAME')
 
-    response = jsonify(user.to_json())
+    response = json_response(user.to_json_bytes())
     response.set_cookie(cookie_name, session_id)
 
     return response
@@ -2,36 +2,132 @@
 """ Base module
 """
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Tuple
+from os import getenv
+from models.metrics import timed
+from models.storage import storage
+from threading import Lock
+import bisect
 import json
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+COMPACT_MODELS = getenv('COMPACT_MODELS', '') not in ('', '0')
 DATA = {}
+INDEXES = {}
+SLOT_NAMES = {}
+# per class: [may_exist() calls, calls answered by no object can match]
+LOOKUPS = {}
+LOOKUPS_LOCK = Lock()
+# per class: {obj_id: (updated_at, public JSON bytes)}
+JSON_CACHE = {}
+# per class: list of all object IDs, sorted
+SORTED_IDS = {}
+SORTED_IDS_LOCK = Lock()
+STORAGE_SECONDS = ('models_storage_seconds',
+                   'Time spent in models.base storage calls')
+
+
+def encode_json(data: dict) -> bytes:
+    """ Encode JSON as flask's jsonify does
+    """
+    return json.dumps(data, sort_keys=True, separators=(',', ':')).encode()
+
+
+class LazyObjects(dict):
+    """ Objects of a class by ID, kept in their serialized form until
+    first accessed
+    """
+
+    def __init__(self, cls: type, objs_json: dict = {}):
+        """ Initialize with serialized objects
+        """
+        super().__init__(objs_json)
+        self.cls = cls
+
+    def __getitem__(self, obj_id: str) -> TypeVar('Base'):
+        """ Return an object, building it if needed
+        """
+        obj = super().__getitem__(obj_id)
+        if type(obj) is dict:
+            obj = self.cls(**obj)
+            super().__setitem__(obj_id, obj)
+        return obj
+
+    def get(self, obj_id: str, default=None) -> TypeVar('Base'):
+        """ Return an object, or default if missing
+        """
+        try:
+            return self[obj_id]
+        except (KeyError, TypeError):
+            return default
+
+    def values(self) -> Iterator[TypeVar('Base')]:
+        """ Iterate over all objects
+        """
+        for obj_id in list(self.keys()):
+            obj = self.get(obj_id)
+            if obj is not None:
+                yield obj
+
+    def items(self) -> Iterator[Tuple[str, TypeVar('Base')]]:
+        """ Iterate over all (ID, object)
+        """
+        for obj_id in list(self.keys()):
+            obj = self.get(obj_id)
+            if obj is not None:
+                yield obj_id, obj
+
+    def serialized_items(self) -> Iterator[Tuple[str, dict]]:
+        """ Iterate over all (ID, serialized object) without building them
+        """
+        for obj_id, obj in list(super().items()):
+            if type(obj) is not dict:
+                obj = obj.to_json(True)
+            yield obj_id, obj
+
+    def attribute(self, obj_id: str, name: str):
+        """ Return an attribute of an object without building it
+        """
+        obj = super().__getitem__(obj_id)
+        if type(obj) is dict:
+            return obj.get(name)
+        return getattr(obj, name, None)
+
+    def to_json_bytes(self, obj_id: str) -> bytes:
+        """ Return the encoded JSON of an object without building it,
+        None if missing; only built objects keep theirs cached, an export
+        of all the records mustn't hold them all
+        """
+        obj = super().get(obj_id)
+        if obj is None or type(obj) is not dict:
+            return None if obj is None else obj.to_json_bytes()
+        return encode_json({k: v for k, v in obj.items() if k[0] != '_'})
 
 
 class Base():
     """ Base class
     """
+    __indexes__ = ()
+    if COMPACT_MODELS:
+        __slots__ = ('id', 'created_at', 'updated_at')
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            DATA[s_class] = LazyObjects(self.__class__)
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
+        # fromisoformat parses TIMESTAMP_FORMAT ~10x faster than strptime
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = datetime.fromisoformat(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = datetime.fromisoformat(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
@@ -48,7 +144,7 @@ class Base():
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        for key, value in self.attributes():
             if not for_serialization and key[0] == '_':
                 continue
             if type(value) is datetime:
@@ -57,49 +153,274 @@ class Base():
                 result[key] = value
         return result
 
+    def to_json_bytes(self) -> bytes:
+        """ to_json() encoded as by flask's jsonify, cached until the
+        object is saved again
+        """
+        cache = JSON_CACHE.setdefault(self.__class__.__name__, {})
+        # read before encoding: a save() racing it outdates the entry
+        updated_at = self.updated_at
+        cached = cache.get(self.id)
+        if cached is not None and cached[0] == updated_at:
+            return cached[1]
+        data = encode_json(self.to_json())
+        cache[self.id] = (updated_at, data)
+        return data
+
+    def uncache(self):
+        """ Forget the cached JSON of the object
+        """
+        JSON_CACHE.get(self.__class__.__name__, {}).pop(self.id, None)
+
+    def attributes(self) -> Iterator[Tuple[str, object]]:
+        """ Iterate over the (name, value) of the object attributes
+        """
+        cls = self.__class__
+        if SLOT_NAMES.get(cls) is None:
+            SLOT_NAMES[cls] = [name for klass in reversed(cls.__mro__)
+                               for name in klass.__dict__.get('__slots__', ())]
+        for name in SLOT_NAMES[cls]:
+            if hasattr(self, name):
+                yield name, getattr(self, name)
+        yield from getattr(self, '__dict__', {}).items()
+
     @classmethod
+    @timed(*STORAGE_SECONDS, op='load_from_file')
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file: they are only built from their
+        serialized form on first access
+        """
+        s_class = cls.__name__
+        DATA[s_class] = LazyObjects(cls, storage.load(s_class))
+        JSON_CACHE.pop(s_class, None)
+        with SORTED_IDS_LOCK:
+            SORTED_IDS[s_class] = sorted(DATA[s_class].keys())
+        cls.rebuild_indexes()
+
+    @classmethod
+    def reload_if_changed(cls) -> bool:
+        """ Load all objects from file again if another process wrote it
+        since, return whether they were reloaded
+        """
+        if not storage.changed(cls.__name__):
+            return False
+        cls.load_from_file()
+        return True
+
+    @classmethod
+    def rebuild_indexes(cls):
+        """ Rebuild the indexes of all objects
+        """
+        s_class = cls.__name__
+        INDEXES[s_class] = ({attr: {} for attr in cls.__indexes__}, {})
+        objs = DATA[s_class]
+        for obj_id in list(objs.keys()):
+            cls.index_values(obj_id, {attr: objs.attribute(obj_id, attr)
+                                      for attr in cls.__indexes__})
+
+    @classmethod
+    def index_values(cls, obj_id: str, values: dict):
+        """ Index an object ID by the values of its indexed attributes
+        """
+        s_class = cls.__name__
+        if INDEXES.get(s_class) is None:
+            INDEXES[s_class] = ({attr: {} for attr in cls.__indexes__}, {})
+        cls.unindex_id(obj_id)
+        indexes, indexed_values = INDEXES[s_class]
+        indexed = {}
+        for attr, index in indexes.items():
+            value = values.get(attr)
+            try:
+                index.setdefault(value, set()).add(obj_id)
+            except TypeError:
+                # unhashable values are only found by scanning
+                continue
+            indexed[attr] = value
+        indexed_values[obj_id] = indexed
+
+    @classmethod
+    def unindex_id(cls, obj_id: str):
+        """ Remove an object ID from the indexes
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
+        if INDEXES.get(s_class) is None:
             return
+        indexes, indexed_values = INDEXES[s_class]
+        for attr, value in indexed_values.pop(obj_id, {}).items():
+            obj_ids = indexes[attr].get(value)
+            if obj_ids is None:
+                continue
+            obj_ids.discard(obj_id)
+            if len(obj_ids) == 0:
+                del indexes[attr][value]
+
+    @classmethod
+    def sort_ids(cls, added: Iterable[str] = (), removed: Iterable[str] = ()):
+        """ Add and remove object IDs in the sorted IDs: by bisection for
+        a few of them, by sorting again for many
+        """
+        s_class = cls.__name__
+        added, removed = list(added), list(removed)
+        with SORTED_IDS_LOCK:
+            obj_ids = SORTED_IDS.get(s_class)
+            if obj_ids is None or len(added) + len(removed) > 64:
+                obj_ids = set(DATA[s_class].keys() if obj_ids is None
+                              else obj_ids)
+                obj_ids.update(added)
+                obj_ids.difference_update(removed)
+                SORTED_IDS[s_class] = sorted(obj_ids)
+                return
+            for obj_id in removed:
+                i = bisect.bisect_left(obj_ids, obj_id)
+                if i < len(obj_ids) and obj_ids[i] == obj_id:
+                    del obj_ids[i]
+            for obj_id in added:
+                i = bisect.bisect_left(obj_ids, obj_id)
+                if i == len(obj_ids) or obj_ids[i] != obj_id:
+                    obj_ids.insert(i, obj_id)
+
+    def index(self):
+        """ Add the indexed attributes of the object to the indexes
+        """
+        self.__class__.index_values(
+            self.id,
+            {attr: getattr(self, attr, None) for attr in self.__indexes__})
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    def unindex(self):
+        """ Remove the object from the indexes
+        """
+        self.__class__.unindex_id(self.id)
 
     @classmethod
+    @timed(*STORAGE_SECONDS, op='save_to_file')
     def save_to_file(cls):
         """ Save all objects to file
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        objs_json = dict(DATA[s_class].serialized_items())
+        storage.dump(s_class, objs_json)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def apply_changes(cls, changes: list):
+        """ Apply ('put' | 'delete', obj) changes to the loaded objects
+        """
+        s_class = cls.__name__
+        objs = DATA[s_class]
+        added, removed = [], []
+        for op, obj in changes:
+            if op == 'put':
+                objs[obj.id] = obj
+                obj.index()
+                added.append(obj.id)
+            elif obj.id in objs:
+                del objs[obj.id]
+                obj.unindex()
+                removed.append(obj.id)
+            obj.uncache()
+        cls.sort_ids(added, removed)
 
+    @timed(*STORAGE_SECONDS, op='save')
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
         DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        self.index()
+        self.uncache()
+        self.__class__.sort_ids(added=[self.id])
+        storage.put(self.__class__, self)
 
+    @timed(*STORAGE_SECONDS, op='remove')
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
         if DATA[s_class].get(self.id) is not None:
             del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+            self.unindex()
+            self.uncache()
+            self.__class__.sort_ids(removed=[self.id])
+            storage.delete(self.__class__, self)
+
+    @classmethod
+    def stage_changes(cls, changes: Iterable[Tuple[str, TypeVar('Base')]]
+                      ) -> List[Tuple[str, TypeVar('Base')]]:
+        """ Apply ('put' | 'delete', obj) changes to the loaded objects,
+        timestamping the saved ones and skipping the removal of missing
+        ones, return the changes to persist
+        """
+        s_class = cls.__name__
+        objs = DATA[s_class]
+        updated_at = datetime.utcnow()
+        staged, added, removed = [], [], []
+        for op, obj in changes:
+            if op == 'put':
+                obj.updated_at = updated_at
+                objs[obj.id] = obj
+                obj.index()
+                added.append(obj.id)
+            elif objs.get(obj.id) is not None:
+                obj = objs[obj.id]
+                del objs[obj.id]
+                obj.unindex()
+                removed.append(obj.id)
+            else:
+                continue
+            obj.uncache()
+            staged.append((op, obj))
+        cls.sort_ids(added, removed)
+        return staged
+
+    @classmethod
+    @timed(*STORAGE_SECONDS, op='bulk_apply')
+    def bulk_apply(cls, changes: Iterable[Tuple[str, TypeVar('Base')]]
+                   ) -> List[Tuple[str, TypeVar('Base')]]:
+        """ Save and remove objects, with one storage write for all of
+        them, return the changes applied
+        """
+        changes = cls.stage_changes(changes)
+        if len(changes) > 0:
+            storage.commit(cls, changes)
+        return changes
+
+    @classmethod
+    @timed(*STORAGE_SECONDS, op='bulk_create')
+    def bulk_create(cls, objs: Iterable[TypeVar('Base')]
+                    ) -> List[TypeVar('Base')]:
+        """ Save objects, with one storage write for all of them
+        """
+        changes = cls.stage_changes(('put', obj) for obj in objs)
+        if len(changes) > 0:
+            storage.commit(cls, changes)
+        return [obj for _, obj in changes]
+
+    @classmethod
+    @timed(*STORAGE_SECONDS, op='bulk_update')
+    def bulk_update(cls, objs: Iterable[TypeVar('Base')]
+                    ) -> List[TypeVar('Base')]:
+        """ Save existing objects, with one storage write for all of them
+        """
+        s_class = cls.__name__
+        changes = cls.stage_changes(('put', obj) for obj in objs
+                                    if DATA[s_class].get(obj.id) is not None)
+        if len(changes) > 0:
+            storage.commit(cls, changes)
+        return [obj for _, obj in changes]
+
+    @classmethod
+    @timed(*STORAGE_SECONDS, op='bulk_delete')
+    def bulk_delete(cls, obj_ids: Iterable[str]) -> int:
+        """ Remove objects by ID, with one storage write for all of them,
+        return the number of objects removed
+        """
+        s_class = cls.__name__
+        objs = (DATA[s_class].get(obj_id) for obj_id in obj_ids)
+        changes = cls.stage_changes(('delete', obj) for obj in objs
+                                    if obj is not None)
+        if len(changes) > 0:
+            storage.commit(cls, changes)
+        return len(changes)
 
     @classmethod
     def count(cls) -> int:
@@ -114,6 +435,44 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def page_ids(cls, after: str = None, limit: int = None) -> List[str]:
+        """ Return object IDs in order, only those greater than after,
+        at most limit of them
+        """
+        s_class = cls.__name__
+        with SORTED_IDS_LOCK:
+            obj_ids = SORTED_IDS.get(s_class)
+            if obj_ids is None:
+                obj_ids = SORTED_IDS[s_class] = sorted(DATA[s_class].keys())
+            start = 0 if after is None else bisect.bisect_right(obj_ids,
+                                                                after)
+            end = None if limit is None else start + limit
+            return obj_ids[start:end]
+
+    @classmethod
+    @timed(*STORAGE_SECONDS, op='page')
+    def page(cls, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Return objects ordered by ID, only IDs greater than after,
+        at most limit of them
+        """
+        s_class = cls.__name__
+        objs = (DATA[s_class].get(obj_id)
+                for obj_id in cls.page_ids(after, limit))
+        return [obj for obj in objs if obj is not None]
+
+    @classmethod
+    def encoded(cls, obj_ids: Iterable[str]) -> Iterator[bytes]:
+        """ Encoded JSON of the objects of IDs, built or not, skipping
+        missing ones
+        """
+        objs = DATA[cls.__name__]
+        for obj_id in obj_ids:
+            data = objs.to_json_bytes(obj_id)
+            if data is not None:
+                yield data
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
@@ -122,10 +481,53 @@ class Base():
         return DATA[s_class].get(id)
 
     @classmethod
+    def may_exist(cls, attributes: dict) -> bool:
+        """ False if no object can match the attributes, because one of
+        them is indexed and no object has its value, in constant time
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.get(s_class, ({}, {}))[0]
+        exists = True
+        for k, v in attributes.items():
+            if k not in indexes:
+                continue
+            try:
+                if v not in indexes[k]:
+                    exists = False
+                    break
+            except TypeError:
+                continue
+        with LOOKUPS_LOCK:
+            lookups = LOOKUPS.setdefault(s_class, [0, 0])
+            lookups[0] += 1
+            lookups[1] += not exists
+        return exists
+
+    @classmethod
+    def lookup_stats(cls) -> dict:
+        """ Number of may_exist() calls, and of those rejected
+        """
+        with LOOKUPS_LOCK:
+            checked, rejected = LOOKUPS.get(cls.__name__, (0, 0))
+        return {'checked': checked, 'rejected': rejected}
+
+    @classmethod
+    @timed(*STORAGE_SECONDS, op='search')
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
         s_class = cls.__name__
+        objs = DATA[s_class].values()
+        indexes = INDEXES.get(s_class, ({}, {}))[0]
+        for k, v in attributes.items():
+            if k not in indexes:
+                continue
+            try:
+                objs = [DATA[s_class][obj_id]
+                        for obj_id in indexes[k].get(v, ())]
+            except TypeError:
+                continue
+            break
 
         def _search(obj):
             if len(attributes) == 0:
@@ -135,4 +537,4 @@ class Base():
                     return False
             return True
 
-        return list(filter(_search, DATA[s_class].values()))
+        return list(filter(_search, objs))
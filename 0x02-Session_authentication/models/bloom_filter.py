@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+""" Bloom filter module
+"""
+from hashlib import blake2b
+from math import ceil, log
+
+
+class BloomFilter():
+    """ BloomFilter class: set membership in a fixed number of bits, with
+    false positives but no false negatives. Not thread safe.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001,
+                 buffer=None):
+        """ Initialize a BloomFilter instance sized for capacity keys at
+        error_rate false positives, in buffer if given (e.g. a slice of
+        a memory mapped file) of at least byte_size() bytes
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = self.bit_size(capacity, error_rate)
+        self.hashes = max(1, round(self.size / capacity * log(2)))
+        nbytes = self.byte_size(capacity, error_rate)
+        if buffer is None:
+            self.bits = bytearray(nbytes)
+        else:
+            self.bits = memoryview(buffer)[:nbytes]
+
+    @staticmethod
+    def bit_size(capacity: int, error_rate: float) -> int:
+        """ Number of bits for capacity keys at error_rate
+        """
+        return max(8, ceil(-capacity * log(error_rate) / log(2) ** 2))
+
+    @classmethod
+    def byte_size(cls, capacity: int, error_rate: float) -> int:
+        """ Number of bytes for capacity keys at error_rate
+        """
+        return (cls.bit_size(capacity, error_rate) + 7) // 8
+
+    def positions(self, key) -> list:
+        """ Bit positions of a key
+        """
+        if isinstance(key, str):
+            key = key.encode()
+        # python's hash() is salted per process: use a stable one
+        digest = blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        """ Add a key
+        """
+        bits = self.bits
+        for position in self.positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key) -> bool:
+        """ False if the key was never added, True if it probably was
+        """
+        bits = self.bits
+        for position in self.positions(key):
+            if not bits[position >> 3] & 1 << (position & 7):
+                return False
+        return True
+
+    def clear(self):
+        """ Remove all keys
+        """
+        self.bits[:] = bytes(len(self.bits))
+
+    def fill_ratio(self) -> float:
+        """ Share of the bits set
+        """
+        ones = bin(int.from_bytes(self.bits, 'little')).count('1')
+        return ones / self.size
+
+    def false_positive_rate(self) -> float:
+        """ Estimated false positive rate for the keys added so far
+        """
+        return self.fill_ratio() ** self.hashes
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+""" Storage module
+"""
+from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_NB
+from os import fsync, getenv, path, remove, rename, replace, stat
+from typing import Tuple
+from threading import (Condition, Lock, RLock, Thread, current_thread,
+                       get_ident, main_thread)
+import atexit
+import json
+import os
+import signal
+import sys
+
+
+def file_signature(file_path: str) -> tuple:
+    """ (inode, mtime, size) of a file, None if it doesn't exist
+    """
+    try:
+        st = stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def fsync_directory(file_path: str):
+    """ Make the last rename in the directory of a file durable
+    """
+    fd = os.open(path.dirname(file_path) or '.', os.O_RDONLY)
+    try:
+        fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_atomically(file_path: str, tmp_path: str, data: str):
+    """ Replace a file by data: readers see either the old or the new
+    content, even if the process crashes
+    """
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+        f.flush()
+        fsync(f.fileno())
+    replace(tmp_path, file_path)
+    fsync_directory(file_path)
+
+
+class FileStorage():
+    """ FileStorage class: rewrite the whole file on every change
+    """
+
+    def __init__(self):
+        """ Initialize a FileStorage instance
+        """
+        # signatures of the files as last loaded or written
+        self.signatures = {}
+        self.__locks = {}
+        self.__lock_files = {}
+
+    def file_path(self, s_class: str) -> str:
+        """ Path of the snapshot file of a class
+        """
+        return ".db_{}.json".format(s_class)
+
+    def signature(self, s_class: str) -> tuple:
+        """ Signature of the files of a class, changed by any write
+        """
+        return file_signature(self.file_path(s_class))
+
+    def changed(self, s_class: str) -> bool:
+        """ Whether the files of a class were written by another process
+        since they were last loaded or written by this one
+        """
+        return self.signature(s_class) != self.signatures.get(s_class)
+
+    @contextmanager
+    def locked(self, s_class: str):
+        """ Hold the write lock of a class, shared by all processes;
+        a thread can take it again while holding it
+        """
+        lock = self.__locks.setdefault(s_class, RLock())
+        with lock:
+            if self.__lock_files.get(s_class) is not None:
+                yield
+                return
+            with open(self.file_path(s_class) + '.lock', 'a') as f:
+                # released when the file is closed
+                flock(f, LOCK_EX)
+                self.__lock_files[s_class] = f
+                try:
+                    yield
+                finally:
+                    self.__lock_files[s_class] = None
+
+    @staticmethod
+    def read(file_path: str) -> dict:
+        """ Return the serialized objects of a snapshot file
+        """
+        if not path.exists(file_path):
+            return {}
+        with open(file_path, 'r') as f:
+            return json.load(f)
+
+    def load(self, s_class: str) -> dict:
+        """ Return all serialized objects of a class
+        """
+        signature = self.signature(s_class)
+        objs_json = self.read(self.file_path(s_class))
+        self.signatures[s_class] = signature
+        return objs_json
+
+    def dump(self, s_class: str, objs_json: dict):
+        """ Write all serialized objects of a class, atomically
+        """
+        file_path = self.file_path(s_class)
+        with self.locked(s_class):
+            # json.dump() only uses the C encoder through json.dumps()
+            write_atomically(file_path, file_path + '.tmp',
+                             json.dumps(objs_json))
+            self.signatures[s_class] = self.signature(s_class)
+
+    def commit(self, cls, changes: list):
+        """ Persist a list of ('put' | 'delete', obj) changes of a class,
+        on top of the changes written by other processes
+        """
+        s_class = cls.__name__
+        with self.locked(s_class):
+            if self.changed(s_class):
+                cls.load_from_file()
+            # the objects may have been reloaded since they were changed
+            cls.apply_changes(changes)
+            cls.save_to_file()
+
+    def put(self, cls, obj):
+        """ Persist a created or updated object
+        """
+        self.commit(cls, [('put', obj)])
+
+    def delete(self, cls, obj):
+        """ Persist a removed object
+        """
+        self.commit(cls, [('delete', obj)])
+
+    def flush(self) -> int:
+        """ Nothing is ever pending: changes are persisted right away
+        """
+        return 0
+
+
+class JournalStorage(FileStorage):
+    """ JournalStorage class: append one record per change to a journal,
+    periodically compacted into the snapshot file in the background
+    """
+
+    def __init__(self, compact_every: int = 1000):
+        """ Initialize a JournalStorage instance
+        """
+        super().__init__()
+        self.compact_every = compact_every
+        self.__records = {}
+        self.__compacting = {}
+
+    def journal_path(self, s_class: str) -> str:
+        """ Path of the journal file of a class
+        """
+        return ".db_{}.journal".format(s_class)
+
+    def signature(self, s_class: str) -> tuple:
+        """ Signature of the snapshot and journal files of a class
+        """
+        journal_path = self.journal_path(s_class)
+        return (super().signature(s_class),
+                file_signature(journal_path + '.compacting'),
+                file_signature(journal_path))
+
+    @staticmethod
+    def replay(objs_json: dict, journal_path: str) -> Tuple[int, int]:
+        """ Apply the records of a journal file, return their count and
+        the offset where the last complete one ends
+        """
+        count = 0
+        end = 0
+        if not path.exists(journal_path):
+            return count, end
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # truncated last record of an interrupted write
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get('op') == 'put':
+                    objs_json[record['id']] = record['obj']
+                else:
+                    objs_json.pop(record['id'], None)
+                count += 1
+                end += len(line)
+        return count, end
+
+    def repair(self, s_class: str, end: int = None):
+        """ Cut the journal of a class after its last complete record, so
+        that appends don't continue an interrupted one; lock held
+        """
+        journal_path = self.journal_path(s_class)
+        if end is None:
+            _, end = self.replay({}, journal_path)
+        if path.exists(journal_path) and path.getsize(journal_path) > end:
+            with open(journal_path, 'r+b') as f:
+                f.truncate(end)
+                f.flush()
+                fsync(f.fileno())
+
+    def load(self, s_class: str) -> dict:
+        """ Return all serialized objects of a class: snapshot + journal
+        """
+        with self.locked(s_class):
+            objs_json = super().load(s_class)
+            journal_path = self.journal_path(s_class)
+            count, _ = self.replay(objs_json, journal_path + '.compacting')
+            journal_count, end = self.replay(objs_json, journal_path)
+            self.repair(s_class, end)
+            self.__records[s_class] = count + journal_count
+            self.resume_compaction(s_class)
+        return objs_json
+
+    def compaction_lock(self, s_class: str, blocking: bool = True):
+        """ Open and lock the file held while a journal of a class is
+        compacted, return it, or None if another compaction holds it
+        """
+        f = open(self.journal_path(s_class) + '.compacting.lock', 'a')
+        try:
+            flock(f, LOCK_EX if blocking else LOCK_EX | LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return None
+        return f
+
+    def resume_compaction(self, s_class: str):
+        """ Compact a rotated journal left by a process that crashed while
+        compacting it; lock held
+        """
+        if self.__compacting.get(s_class) or \
+                not path.exists(self.journal_path(s_class) + '.compacting'):
+            return
+        lock_file = self.compaction_lock(s_class, blocking=False)
+        if lock_file is None:
+            # another process is compacting it
+            return
+        self.__compacting[s_class] = True
+        Thread(target=self.compact, args=(s_class, lock_file),
+               daemon=True).start()
+
+    def dump(self, s_class: str, objs_json: dict):
+        """ Write a full snapshot and drop the journal
+        """
+        with self.locked(s_class):
+            super().dump(s_class, objs_json)
+            journal_path = self.journal_path(s_class)
+            for stale_path in (journal_path, journal_path + '.compacting'):
+                if path.exists(stale_path):
+                    remove(stale_path)
+            self.__records[s_class] = 0
+            self.signatures[s_class] = self.signature(s_class)
+
+    def append(self, s_class: str, records: list):
+        """ Append records to the journal of a class, in one write
+        """
+        lines = ''.join(json.dumps(record) + '\n' for record in records)
+        with self.locked(s_class):
+            # records of other processes are still to be loaded
+            seen = not self.changed(s_class)
+            journal_path = self.journal_path(s_class)
+            self.resume_compaction(s_class)
+            with open(journal_path, 'a+b') as f:
+                if f.tell() > 0 and os.pread(f.fileno(), 1,
+                                             f.tell() - 1) != b'\n':
+                    # a writer crashed in the middle of a record
+                    self.repair(s_class)
+                    f.seek(0, os.SEEK_END)
+                f.write(lines.encode())
+                f.flush()
+                fsync(f.fileno())
+            count = self.__records.get(s_class, 0) + len(records)
+            self.__records[s_class] = count
+            compact = (count >= self.compact_every and
+                       not self.__compacting.get(s_class) and
+                       not path.exists(journal_path + '.compacting'))
+            if compact:
+                # locked before the rename: no other process may take the
+                # rotated journal for one left by a crash
+                lock_file = self.compaction_lock(s_class)
+                # new records go to a fresh journal while the old one is
+                # merged
+                rename(journal_path, journal_path + '.compacting')
+                self.__records[s_class] = 0
+                self.__compacting[s_class] = True
+            if seen:
+                self.signatures[s_class] = self.signature(s_class)
+        if compact:
+            Thread(target=self.compact, args=(s_class, lock_file),
+                   daemon=True).start()
+
+    def compact(self, s_class: str, lock_file=None):
+        """ Merge the rotated journal of a class into its snapshot, holding
+        the compaction lock (lock_file if already taken) meanwhile
+        """
+        if lock_file is None:
+            lock_file = self.compaction_lock(s_class)
+        try:
+            file_path = self.file_path(s_class)
+            compacting_path = self.journal_path(s_class) + '.compacting'
+            objs_json = self.read(file_path)
+            self.replay(objs_json, compacting_path)
+            tmp_path = compacting_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(json.dumps(objs_json))
+                f.flush()
+                fsync(f.fileno())
+            with self.locked(s_class):
+                if not path.exists(compacting_path):
+                    # a full snapshot was dumped in the meantime
+                    remove(tmp_path)
+                    return
+                seen = not self.changed(s_class)
+                replace(tmp_path, file_path)
+                fsync_directory(file_path)
+                remove(compacting_path)
+                if seen:
+                    self.signatures[s_class] = self.signature(s_class)
+        finally:
+            self.__compacting[s_class] = False
+            lock_file.close()
+
+    def commit(self, cls, changes: list):
+        """ Persist a list of ('put' | 'delete', obj) changes of a class
+        """
+        records = []
+        for op, obj in changes:
+            record = {'op': op, 'id': obj.id}
+            if op == 'put':
+                record['obj'] = obj.to_json(True)
+            records.append(record)
+        self.append(cls.__name__, records)
+
+
+class WriteBehindStorage():
+    """ WriteBehindStorage class: queue changes in memory and commit them
+    to another storage in batches from a background thread, every
+    flush_interval seconds or as soon as flush_size changes are pending
+    """
+
+    def __init__(self, backend: FileStorage, flush_size: int = 1000,
+                 flush_interval: float = 0.05):
+        """ Initialize a WriteBehindStorage instance
+        """
+        self.backend = backend
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.__pending = []
+        self.__condition = Condition()
+        # batches are committed one at a time, in order
+        self.__flush_lock = Lock()
+        # thread committing a batch, whose backend reloads and dumps
+        # the class it commits
+        self.__flusher = None
+        Thread(target=self.flush_forever, daemon=True).start()
+
+    def file_path(self, s_class: str) -> str:
+        """ Path of the snapshot file of a class
+        """
+        return self.backend.file_path(s_class)
+
+    def flush_pending(self):
+        """ Commit the pending changes before the files are read or
+        overwritten, unless called back by the backend committing them
+        """
+        if self.__flusher != get_ident():
+            self.flush()
+
+    def load(self, s_class: str) -> dict:
+        """ Return all serialized objects of a class, pending changes
+        included
+        """
+        self.flush_pending()
+        return self.backend.load(s_class)
+
+    def dump(self, s_class: str, objs_json: dict):
+        """ Write all serialized objects of a class, after the pending
+        changes so that they don't overwrite it
+        """
+        self.flush_pending()
+        self.backend.dump(s_class, objs_json)
+
+    def changed(self, s_class: str) -> bool:
+        """ Whether the files of a class were written by another process;
+        never while changes are pending, they are merged on commit
+        """
+        with self.__condition:
+            if len(self.__pending) > 0:
+                return False
+        return self.backend.changed(s_class)
+
+    def commit(self, cls, changes: list):
+        """ Queue a list of ('put' | 'delete', obj) changes of a class,
+        waking the flusher up if a batch is full
+        """
+        with self.__condition:
+            self.__pending.extend((cls, op, obj) for op, obj in changes)
+            if len(self.__pending) >= self.flush_size:
+                self.__condition.notify()
+
+    def put(self, cls, obj):
+        """ Queue a created or updated object
+        """
+        self.commit(cls, [('put', obj)])
+
+    def delete(self, cls, obj):
+        """ Queue a removed object
+        """
+        self.commit(cls, [('delete', obj)])
+
+    def flush(self) -> int:
+        """ Commit all pending changes, one commit per class, return
+        their number
+        """
+        with self.__flush_lock:
+            with self.__condition:
+                pending, self.__pending = self.__pending, []
+            changes = {}
+            for cls, op, obj in pending:
+                changes.setdefault(cls, []).append((op, obj))
+            self.__flusher = get_ident()
+            try:
+                for cls, cls_changes in changes.items():
+                    self.backend.commit(cls, cls_changes)
+            except BaseException:
+                # commits are idempotent: retry the whole batch next time
+                with self.__condition:
+                    self.__pending[:0] = pending
+                raise
+            finally:
+                self.__flusher = None
+            return len(pending)
+
+    def flush_forever(self):
+        """ Flusher thread loop
+        """
+        while True:
+            with self.__condition:
+                if len(self.__pending) < self.flush_size:
+                    self.__condition.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print("write-behind flush failed: {}".format(e),
+                      file=sys.stderr)
+
+
+def exit_on_sigterm(signum, frame):
+    """ Turn SIGTERM into a normal exit, so that atexit hooks run
+    """
+    sys.exit(128 + signum)
+
+
+if getenv('STORAGE_TYPE') == 'journal':
+    storage = JournalStorage(int(getenv('STORAGE_COMPACT_EVERY', 1000)))
+else:
+    storage = FileStorage()
+
+if getenv('STORAGE_WRITE_BEHIND', '') not in ('', '0'):
+    storage = WriteBehindStorage(
+        storage, int(getenv('STORAGE_FLUSH_SIZE', 1000)),
+        float(getenv('STORAGE_FLUSH_INTERVAL', 0.05)))
+    # pending changes are written before the process exits
+    atexit.register(storage.flush)
+    if (current_thread() is main_thread() and
+            signal.getsignal(signal.SIGTERM) == signal.SIG_DFL):
+        signal.signal(signal.SIGTERM, exit_on_sigterm)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+""" Tests of api.v1.app
+"""
+from api.v1.app import app
+from api.v1.auth.basic_auth import BasicAuth
+from api.v1.auth.session_auth import SessionAuth
+from base64 import b64encode
+from models.storage import storage
+from models.user import User
+from unittest.mock import patch
+import os
+import tempfile
+import unittest
+
+
+class TestAuthentication(unittest.TestCase):
+    """ Authentication of the requests
+    """
+
+    def setUp(self):
+        """ Work in an empty directory, with one user
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.env = patch.dict(os.environ, {'SESSION_NAME': '_my_session_id'})
+        self.env.start()
+        User.load_from_file()
+        self.user = User(email='bob@hbtn.io')
+        self.user.password = 'pwd'
+        self.user.save()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        """ Back to the original directory and environment
+        """
+        storage.flush()
+        self.env.stop()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def get_me(self, auth, **kwargs):
+        """ GET /api/v1/users/me with auth, counting the reads of the
+        header and cookie
+        """
+        with patch('api.v1.app.auth', auth), \
+                patch.object(auth, 'authorization_header',
+                             wraps=auth.authorization_header) as header, \
+                patch.object(auth, 'session_cookie',
+                             wraps=auth.session_cookie) as cookie:
+            response = self.client.get('/api/v1/users/me', **kwargs)
+        return response, header.call_count, cookie.call_count
+
+    def test_basic_auth(self):
+        """ The Authorization header is read once
+        """
+        credentials = b64encode(b'bob@hbtn.io:pwd').decode()
+        response, headers, cookies = self.get_me(
+            BasicAuth(), headers={'Authorization': 'Basic ' + credentials})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['id'], self.user.id)
+        self.assertEqual((headers, cookies), (1, 1))
+
+    def test_session_auth(self):
+        """ The session cookie is read once
+        """
+        auth = SessionAuth()
+        self.client.set_cookie('_my_session_id',
+                               auth.create_session(self.user.id))
+        response, headers, cookies = self.get_me(auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['id'], self.user.id)
+        self.assertEqual((headers, cookies), (1, 1))
+
+    def test_unauthenticated(self):
+        """ Requests without credentials are refused, bad ones forbidden
+        """
+        response, _, _ = self.get_me(BasicAuth())
+        self.assertEqual(response.status_code, 401)
+        response, _, _ = self.get_me(
+            BasicAuth(), headers={'Authorization': 'Basic Ym9iOmJhZA=='})
+        self.assertEqual(response.status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
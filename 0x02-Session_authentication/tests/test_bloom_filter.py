@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+""" Tests of models.bloom_filter
+"""
+from models.bloom_filter import BloomFilter
+import unittest
+
+
+class TestBloomFilter(unittest.TestCase):
+    """ BloomFilter
+    """
+
+    def test_no_false_negative(self):
+        """ Every added key is found, as str or bytes
+        """
+        bloom_filter = BloomFilter(1000)
+        for i in range(1000):
+            bloom_filter.add('key{}'.format(i))
+        for i in range(1000):
+            self.assertIn('key{}'.format(i), bloom_filter)
+            self.assertIn('key{}'.format(i).encode(), bloom_filter)
+
+    def test_false_positive_rate(self):
+        """ At capacity, false positives stay close to error_rate
+        """
+        bloom_filter = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom_filter.add('key{}'.format(i))
+        false_positives = sum('other{}'.format(i) in bloom_filter
+                              for i in range(10000))
+        self.assertLess(false_positives, 300)
+        self.assertLess(bloom_filter.false_positive_rate(), 0.03)
+
+    def test_sizing(self):
+        """ Bits and hashes follow capacity and error_rate
+        """
+        bloom_filter = BloomFilter(1000, 0.001)
+        self.assertEqual(bloom_filter.size, 14378)
+        self.assertEqual(bloom_filter.hashes, 10)
+        self.assertEqual(len(bloom_filter.bits),
+                         BloomFilter.byte_size(1000, 0.001))
+        self.assertEqual(BloomFilter(1, 0.5).size, 8)
+
+    def test_clear(self):
+        """ clear() removes all keys
+        """
+        bloom_filter = BloomFilter(100)
+        bloom_filter.add('key')
+        self.assertGreater(bloom_filter.fill_ratio(), 0)
+        bloom_filter.clear()
+        self.assertNotIn('key', bloom_filter)
+        self.assertEqual(bloom_filter.fill_ratio(), 0)
+
+    def test_buffer(self):
+        """ Filters in the same buffer share their keys
+        """
+        buffer = bytearray(BloomFilter.byte_size(100, 0.001) + 4)
+        BloomFilter(100, 0.001, buffer).add('key')
+        self.assertIn('key', BloomFilter(100, 0.001, buffer))
+        self.assertEqual(buffer[-4:], bytes(4))
+
+
+if __name__ == '__main__':
+    unittest.main()
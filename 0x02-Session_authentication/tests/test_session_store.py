@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+""" Tests of api.v1.auth.session_store
+"""
+from api.v1.auth.session_store import (MemorySessionStore,
+                                       MmapSessionStore, SessionStoreFull,
+                                       SQLiteSessionStore)
+from hashlib import blake2b
+import os
+import random
+import tempfile
+import unittest
+
+
+class StoreTests:
+    """ Tests run against every store
+    """
+
+    def new_store(self):
+        """ Empty store to test
+        """
+        raise NotImplementedError()
+
+    def setUp(self):
+        """ Work in an empty directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.store = self.new_store()
+
+    def tearDown(self):
+        """ Back to the original directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_set_get_delete(self):
+        """ Sessions are stored, replaced and deleted
+        """
+        self.store.set('s1', 'u1', 100)
+        self.store['s2'] = 'u2'
+        self.assertEqual(self.store.get_record('s1'), ('u1', 100, 100))
+        self.assertEqual(self.store['s2'], 'u2')
+        self.store.set('s1', 'u3', 200)
+        self.assertEqual(self.store.get('s1'), 'u3')
+        self.assertEqual(len(self.store), 2)
+        self.assertTrue(self.store.delete('s1'))
+        self.assertFalse(self.store.delete('s1'))
+        self.assertNotIn('s1', self.store)
+        with self.assertRaises(KeyError):
+            del self.store['s1']
+        self.assertEqual(len(self.store), 1)
+
+    def test_touch(self):
+        """ Touching a session only updates its access time
+        """
+        self.store.set('s1', 'u1', 100)
+        self.store.touch('s1', 150)
+        self.store.touch('missing', 150)
+        self.assertEqual(self.store.get_record('s1'), ('u1', 100, 150))
+        self.assertIsNone(self.store.get_record('missing'))
+
+    def test_expire(self):
+        """ Sessions created or accessed too long ago are deleted
+        """
+        self.store.set('old', 'u1', 100)
+        self.store.set('idle', 'u2', 200)
+        self.store.set('fresh', 'u3', 200)
+        self.store.touch('fresh', 300)
+        self.assertEqual(self.store.expire(), 0)
+        deleted = 0
+        for _ in range(self.sweeps):
+            deleted += self.store.expire(created_before=150)
+        self.assertEqual(deleted, 1)
+        self.assertNotIn('old', self.store)
+        for _ in range(self.sweeps):
+            deleted += self.store.expire(accessed_before=250)
+        self.assertEqual(deleted, 2)
+        self.assertEqual(self.store.get('fresh'), 'u3')
+        self.assertEqual(len(self.store), 1)
+
+    def test_expire_batch(self):
+        """ One call deletes at most batch sessions
+        """
+        for i in range(10):
+            self.store.set('s{}'.format(i), 'u', 100)
+        self.assertLessEqual(self.store.expire(created_before=150, batch=4), 4)
+        deleted = 10 - len(self.store)
+        while len(self.store) > 0:
+            deleted += self.store.expire(created_before=150, batch=4)
+        self.assertEqual(deleted, 10)
+
+
+class TestMemorySessionStore(StoreTests, unittest.TestCase):
+    """ MemorySessionStore
+    """
+    sweeps = 1
+
+    def new_store(self):
+        """ Empty store to test
+        """
+        return MemorySessionStore()
+
+
+class TestSQLiteSessionStore(StoreTests, unittest.TestCase):
+    """ SQLiteSessionStore
+    """
+    sweeps = 1
+
+    def new_store(self):
+        """ Empty store to test
+        """
+        return SQLiteSessionStore('sessions.db')
+
+
+class TestMmapSessionStore(StoreTests, unittest.TestCase):
+    """ MmapSessionStore
+    """
+    capacity = 16
+    # expire() looks at a batch of slots: enough calls sweep them all
+    sweeps = 16
+
+    def new_store(self):
+        """ Empty store to test
+        """
+        return MmapSessionStore('sessions.mmap', self.capacity)
+
+    def keys_homed_at(self, home: int, count: int) -> list:
+        """ Session IDs whose probe sequence starts at slot home
+        """
+        keys = []
+        i = 0
+        while len(keys) < count:
+            key = 'k{}'.format(i)
+            digest = blake2b(key.encode(), digest_size=8).digest()
+            if int.from_bytes(digest, 'little') % self.capacity == home:
+                keys.append(key)
+            i += 1
+        return keys
+
+    def test_wraparound(self):
+        """ Probe sequences wrap around the end of the table, and
+        deletions keep the rest of the cluster reachable
+        """
+        keys = self.keys_homed_at(self.capacity - 1, 4)
+        for key in keys:
+            self.store.set(key, 'u' + key)
+        self.assertTrue(self.store.delete(keys[0]))
+        for key in keys[1:]:
+            self.assertEqual(self.store.get(key), 'u' + key)
+        self.assertTrue(self.store.delete(keys[2]))
+        for key in (keys[1], keys[3]):
+            self.assertEqual(self.store.get(key), 'u' + key)
+        self.assertIsNone(self.store.get(keys[2]))
+        self.assertEqual(len(self.store), 2)
+
+    def test_full(self):
+        """ A full table refuses new sessions but still replaces and
+        deletes them, then makes room again
+        """
+        for i in range(self.store.max_used):
+            self.store.set('s{}'.format(i), 'u')
+        with self.assertRaises(SessionStoreFull):
+            self.store.set('new', 'u')
+        self.store.set('s0', 'u0')
+        self.assertEqual(self.store.get('s0'), 'u0')
+        self.assertIsNone(self.store.get('new'))
+        self.assertTrue(self.store.delete('s1'))
+        self.store.set('new', 'u')
+        self.assertEqual(self.store.get('new'), 'u')
+        self.assertEqual(len(self.store), self.store.max_used)
+
+    def test_too_long(self):
+        """ Session and user IDs longer than a slot are refused
+        """
+        with self.assertRaises(ValueError):
+            self.store.set('s' * 64, 'u')
+
+    def test_reopen(self):
+        """ Another store mapping the same file sees the sessions
+        """
+        self.store.set('s1', 'u1', 100)
+        other = self.new_store()
+        self.assertEqual(other.get_record('s1'), ('u1', 100, 100))
+        other.delete('s1')
+        self.assertNotIn('s1', self.store)
+
+    def test_random_against_dict(self):
+        """ Random sets, deletes and expirations agree with a dict
+        """
+        rand = random.Random(0)
+        store = MmapSessionStore('random.mmap', 64)
+        expected = {}
+        for step in range(5000):
+            key = 's{}'.format(rand.randrange(80))
+            action = rand.random()
+            if action < 0.5:
+                try:
+                    store.set(key, 'u{}'.format(step), step)
+                except SessionStoreFull:
+                    self.assertNotIn(key, expected)
+                    self.assertEqual(len(expected), store.max_used)
+                else:
+                    expected[key] = ('u{}'.format(step), step)
+            elif action < 0.95:
+                self.assertEqual(store.delete(key), key in expected)
+                expected.pop(key, None)
+            else:
+                # a few slots are swept: only old sessions may be gone
+                deleted = store.expire(created_before=step - 100, batch=8)
+                gone = [k for k in expected if k not in store]
+                self.assertEqual(len(gone), deleted)
+                for k in gone:
+                    self.assertLess(expected.pop(k)[1], step - 100)
+            self.assertEqual(store.get_record(key)[:2] if key in expected
+                             else store.get(key), expected.get(key))
+            self.assertEqual(len(store), len(expected))
+        for i in range(80):
+            key = 's{}'.format(i)
+            self.assertEqual(store.get(key), expected.get(key, [None])[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+""" Tests of api.v1.auth.signed_session_auth and its revocation list
+"""
+from api.v1.auth.revocation_list import RevocationList
+from api.v1.auth.signed_session_auth import SignedSessionAuth
+from types import SimpleNamespace
+from unittest.mock import patch
+import os
+import tempfile
+import unittest
+
+
+class TestRevocationList(unittest.TestCase):
+    """ RevocationList
+    """
+
+    def setUp(self):
+        """ Work in an empty directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        """ Back to the original directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def test_add(self):
+        """ Revoked keys are found, others aren't
+        """
+        revoked = RevocationList(capacity=1000)
+        revoked.add('a')
+        self.assertIn('a', revoked)
+        self.assertNotIn('b', revoked)
+        stats = revoked.stats()
+        self.assertGreater(stats['revocation_bytes'], 0)
+        self.assertLess(stats['revocation_false_positive_rate'], 0.001)
+
+    @patch('api.v1.auth.revocation_list.time')
+    def test_rotation(self, now):
+        """ A key is kept for one period at least, and forgotten once the
+        filter holding it is reused
+        """
+        revoked = RevocationList(period=100, capacity=1000)
+        now.return_value = 1000
+        revoked.add('a')
+        now.return_value = 1099
+        revoked.add('b')
+        now.return_value = 1150
+        revoked.add('c')
+        for key in ('a', 'b', 'c'):
+            self.assertIn(key, revoked)
+        now.return_value = 1260
+        revoked.add('d')
+        for key in ('a', 'b'):
+            self.assertNotIn(key, revoked)
+        for key in ('c', 'd'):
+            self.assertIn(key, revoked)
+
+    def test_shared_file(self):
+        """ Lists mapping the same file share their keys, a file of
+        another size is started over
+        """
+        RevocationList('revoked', capacity=1000).add('a')
+        self.assertIn('a', RevocationList('revoked', capacity=1000))
+        self.assertNotIn('a', RevocationList('revoked', capacity=2000))
+
+
+class TestSignedSessionAuth(unittest.TestCase):
+    """ SignedSessionAuth tokens
+    """
+
+    def setUp(self):
+        """ Work in an empty directory, with a shared secret
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        self.env = patch.dict(os.environ, {
+            'SESSION_SECRET': 'secret', 'SESSION_DURATION': '60',
+            'SESSION_NAME': '_my_session_id',
+            'SESSION_REVOCATION_CAPACITY': '1000'})
+        self.env.start()
+        self.auth = SignedSessionAuth()
+
+    def tearDown(self):
+        """ Back to the original directory and environment
+        """
+        self.env.stop()
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def request(self, session_id: str):
+        """ Request carrying a session cookie
+        """
+        return SimpleNamespace(cookies={'_my_session_id': session_id})
+
+    def test_valid(self):
+        """ A token is valid in every process sharing the secret
+        """
+        session_id = self.auth.create_session('user.1')
+        self.assertEqual(self.auth.user_id_for_session_id(session_id),
+                         'user.1')
+        self.assertEqual(SignedSessionAuth().user_id_for_session_id(
+            session_id), 'user.1')
+        self.assertNotEqual(self.auth.create_session('user.1'), session_id)
+        self.assertIsNone(self.auth.create_session(None))
+        self.assertIsNone(self.auth.create_session(1))
+
+    def test_tampered(self):
+        """ Changing any part of a token invalidates it
+        """
+        session_id = self.auth.create_session('user1')
+        user_id, expires_at, nonce, signature = session_id.split('.')
+        for fields in (('user2', expires_at, nonce, signature),
+                       (user_id, str(int(expires_at) + 1), nonce, signature),
+                       (user_id, expires_at, nonce + '0', signature),
+                       (user_id, expires_at, nonce, signature[:-1])):
+            self.assertIsNone(
+                self.auth.user_id_for_session_id('.'.join(fields)))
+        with patch.dict(os.environ, {'SESSION_SECRET': 'other'}):
+            self.assertIsNone(
+                SignedSessionAuth().user_id_for_session_id(session_id))
+
+    @patch('api.v1.auth.signed_session_auth.time')
+    def test_expired(self, now):
+        """ A token is refused from its expiration time on
+        """
+        now.return_value = 1000
+        session_id = self.auth.create_session('user1')
+        now.return_value = 1059
+        self.assertEqual(self.auth.user_id_for_session_id(session_id),
+                         'user1')
+        now.return_value = 1060
+        self.assertIsNone(self.auth.user_id_for_session_id(session_id))
+
+    def test_malformed(self):
+        """ Malformed and non-ASCII tokens are refused without error
+        """
+        session_id = self.auth.create_session('user1')
+        signed = [payload + '.' + self.auth.signature(payload)
+                  for payload in ('', 'user1', 'user1.soon.nonce',
+                                  'user1.-1.nonce')]
+        for bad in [None, 1, '', '.', 'abc', 'a.b.c.d', session_id + 'é',
+                    'é' + session_id, session_id.replace('user1', 'usér1'),
+                    '\x00' + session_id] + signed:
+            self.assertIsNone(self.auth.user_id_for_session_id(bad))
+
+    def test_revoked(self):
+        """ A destroyed session is refused everywhere, other sessions of
+        the user stay valid
+        """
+        session_id = self.auth.create_session('user1')
+        other = self.auth.create_session('user1')
+        self.assertFalse(self.auth.destroy_session(None))
+        self.assertFalse(self.auth.destroy_session(self.request('bad')))
+        self.assertTrue(self.auth.destroy_session(self.request(session_id)))
+        self.assertIsNone(self.auth.user_id_for_session_id(session_id))
+        self.assertIsNone(
+            SignedSessionAuth().user_id_for_session_id(session_id))
+        self.assertFalse(self.auth.destroy_session(self.request(session_id)))
+        self.assertEqual(self.auth.user_id_for_session_id(other), 'user1')
+
+
+if __name__ == '__main__':
+    unittest.main()
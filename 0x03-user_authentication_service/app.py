@@ -8,12 +8,57 @@ from flask import (
     jsonify,
     Response,
     url_for,
-    make_response)
+    make_response,
+    g)
+from math import ceil
+from time import perf_counter
 from auth import Auth
+from hashing_pool import HashingPoolFull
+from login_throttle import LoginThrottled
+import metrics
 
 AUTH = Auth()
 app = Flask(__name__)
 
+if metrics.ENABLED:
+    request_seconds = metrics.histogram(
+        'http_request_seconds', 'Time spent serving requests per route')
+
+    @app.before_request
+    def start_request_timer() -> None:
+        """ Runs first at each request. """
+        g.request_start = perf_counter()
+
+    @app.after_request
+    def observe_request_time(response: Response) -> Response:
+        """ Records the request latency of its route. """
+        if 'request_start' in g:
+            rule = request.url_rule.rule if request.url_rule else 'unmatched'
+            request_seconds.observe(
+                perf_counter() - g.request_start,
+                (('method', request.method), ('route', rule)))
+        return response
+
+
+@app.errorhandler(HashingPoolFull)
+def busy(error) -> Response:
+    """ Password hashing is saturated: ask the client to retry. """
+    return jsonify({"message": "service busy"}), 503
+
+
+@app.errorhandler(LoginThrottled)
+def throttled(error) -> Response:
+    """ Too many failed logins: ask the client to retry later. """
+    response = jsonify({"message": "too many login attempts"})
+    response.headers["Retry-After"] = str(ceil(error.retry_after))
+    return response, 429
+
+
+@app.teardown_appcontext
+def close_db_session(exception=None) -> None:
+    """ Release the database session at the end of each request. """
+    AUTH.close_session()
+
 
 @app.route('/', methods=['GET'], strict_slashes=False)
 def index() -> Response:
@@ -21,6 +66,25 @@ def index() -> Response:
     return jsonify({"message": "Bienvenue"})
 
 
+@app.route('/metrics', methods=['GET'], strict_slashes=False)
+def metrics_route() -> Response:
+    """ Latency histograms, hashing pool and session cache gauges,
+    Prometheus format. """
+    if not metrics.ENABLED:
+        abort(404)
+    stats = AUTH.hashing_stats()
+    cache_stats = AUTH.session_cache_stats()
+    gauges = {"hashing_pending": stats["pending"],
+              "hashing_rejected": stats["rejected"],
+              "hashing_restarts": stats["restarts"],
+              "hashing_workers": stats["workers"],
+              "session_cache_hits": cache_stats["hits"],
+              "session_cache_misses": cache_stats["misses"],
+              "session_cache_size": cache_stats["size"]}
+    return Response(metrics.expose(gauges),
+                    mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/users/', methods=['POST'], strict_slashes=False)
 def users() -> Response:
     """ Register user """
@@ -42,7 +106,7 @@ def profile() -> Response:
     session_id = request.cookies.get('session_id')
     if session_id is None:
         abort(403)
-    user = AUTH.get_user_from_session_id(session_id=session_id)
+    user = AUTH.session_user(session_id)
     if user:
         return jsonify({"email": "{}".format(user.email)})
     else:
@@ -55,7 +119,7 @@ def login() -> Response:
     email = request.form.get('email')
     password = request.form.get('password')
 
-    is_valid_user = AUTH.valid_login(email, password)
+    is_valid_user = AUTH.valid_login(email, password, request.remote_addr)
     if is_valid_user:
         session_id = AUTH.create_session(email)
         resp = jsonify(
@@ -70,7 +134,7 @@ def login() -> Response:
 def logout() -> Response:
     """ Logout user"""
     session_id = request.cookies.get('session_id')
-    user = AUTH.get_user_from_session_id(session_id)
+    user = AUTH.session_user(session_id)
     if user:
         AUTH.destroy_session(user.id)
         response = make_response(redirect(url_for('index')))
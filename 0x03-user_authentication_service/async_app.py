@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Quart (asyncio) Application, same routes as app.py"""
+from quart import (
+    Quart,
+    abort,
+    request,
+    redirect,
+    jsonify,
+    Response,
+    url_for,
+    make_response)
+from math import ceil
+from async_auth import AsyncAuth
+from hashing_pool import HashingPoolFull
+from login_throttle import LoginThrottled
+
+AUTH = AsyncAuth()
+app = Quart(__name__)
+
+
+@app.before_serving
+async def migrate() -> None:
+    """ Create the missing tables before the first request. """
+    await AUTH.migrate()
+
+
+@app.after_serving
+async def close_db() -> None:
+    """ Close the database connections on shutdown. """
+    await AUTH.close()
+
+
+@app.errorhandler(HashingPoolFull)
+async def busy(error) -> Response:
+    """ Password hashing is saturated: ask the client to retry. """
+    return jsonify({"message": "service busy"}), 503
+
+
+@app.errorhandler(LoginThrottled)
+async def throttled(error) -> Response:
+    """ Too many failed logins: ask the client to retry later. """
+    response = jsonify({"message": "too many login attempts"})
+    response.headers["Retry-After"] = str(ceil(error.retry_after))
+    return response, 429
+
+
+@app.route('/', methods=['GET'], strict_slashes=False)
+async def index() -> Response:
+    """ App root route. """
+    return jsonify({"message": "Bienvenue"})
+
+
+@app.route('/users/', methods=['POST'], strict_slashes=False)
+async def users() -> Response:
+    """ Register user """
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+
+    try:
+        user = await AUTH.register_user(email, password)
+        if user:
+            return jsonify({"email": "{}".format(email),
+                            "message": "user created"})
+    except ValueError:
+        return jsonify({"message": "email already registered"}), 404
+
+
+@app.route('/profile/', methods=['GET'], strict_slashes=False)
+async def profile() -> Response:
+    """ Profile route """
+    session_id = request.cookies.get('session_id')
+    if session_id is None:
+        abort(403)
+    user = await AUTH.session_user(session_id)
+    if user:
+        return jsonify({"email": "{}".format(user.email)})
+    else:
+        abort(403)
+
+
+@app.route('/sessions/', methods=['POST'], strict_slashes=False)
+async def login() -> Response:
+    """ login user"""
+    form = await request.form
+    email = form.get('email')
+    password = form.get('password')
+
+    is_valid_user = await AUTH.valid_login(
+        email, password, request.remote_addr)
+    if is_valid_user:
+        session_id = await AUTH.create_session(email)
+        resp = jsonify(
+            {"email": "{}".format(email), "message": "logged in"})
+        resp.set_cookie("session_id", session_id)
+        return resp
+    else:
+        abort(401)
+
+
+@app.route('/sessions/', methods=['DELETE'], strict_slashes=False)
+async def logout() -> Response:
+    """ Logout user"""
+    session_id = request.cookies.get('session_id')
+    user = await AUTH.session_user(session_id)
+    if user:
+        await AUTH.destroy_session(user.id)
+        response = await make_response(redirect(url_for('index')))
+        response.set_cookie('session_id', '')
+        return response
+    else:
+        abort(403)
+
+
+@app.route('/reset_password/', methods=['POST'], strict_slashes=False)
+async def get_reset_password_token() -> Response:
+    """ Generate password token. """
+    form = await request.form
+    email = form.get('email')
+    try:
+        token = await AUTH.get_reset_password_token(email)
+        return jsonify({"email": "{}".format(email),
+                        "reset_token": "{}".format(token)})
+    except ValueError:
+        abort(403)
+
+
+@app.route('/reset_password/', methods=['PUT'], strict_slashes=False)
+async def update_password() -> Response:
+    """ Update password. """
+    form = await request.form
+    email = form.get('email')
+    reset_token = form.get('reset_token')
+    new_password = form.get('new_password')
+
+    try:
+        await AUTH.update_password(
+            reset_token=reset_token, password=new_password)
+        return jsonify({"email": "{}".format(email),
+                        "message": "Password updated"})
+    except ValueError:
+        abort(403)
+
+
+if __name__ == "__main__":
+    app.run(host="0.0.0.0", port="5000")
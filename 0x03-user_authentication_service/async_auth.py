@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+""" Async Authentication Module. """
+from typing import Optional
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import NoResultFound
+
+from async_db import async_db_from_env
+from auth import _check_password, _generate_uuid, _hash_password
+from hashing_pool import HashingPool
+from login_throttle import LoginThrottled, login_throttle_from_env
+from session_cache import UserSnapshot, session_cache_from_env
+from user import User
+
+
+class AsyncAuth:
+    """AsyncAuth class: same API as Auth, with coroutines
+    """
+
+    def __init__(self):
+        self._db = async_db_from_env()
+        self._hashing_pool = HashingPool()
+        self._session_cache = session_cache_from_env()
+        self._login_throttle = login_throttle_from_env()
+
+    async def migrate(self) -> None:
+        """ Prepare the database """
+        await self._db.migrate()
+
+    async def close(self) -> None:
+        """ Release the database connections """
+        await self._db.close()
+
+    def hashing_stats(self) -> dict:
+        """ Queue depth and latency of password hashing """
+        return self._hashing_pool.stats()
+
+    def session_cache_stats(self) -> dict:
+        """ Size and hit/miss counters of the session cache """
+        return self._session_cache.stats()
+
+    async def register_user(self, email: str, password: str) -> User:
+        """ Adds a user to the database with validation"""
+        try:
+            await self._db.find_user_by(email=email)
+            raise ValueError("User {} already exists.".format(email))
+        except NoResultFound:
+            password_hash = await self._hashing_pool.run_async(
+                _hash_password, password)
+            try:
+                return await self._db.add_user(email, password_hash)
+            except IntegrityError:
+                # registered concurrently since the lookup
+                raise ValueError("User {} already exists.".format(email))
+
+    async def valid_login(self, email: str, password: str,
+                          ip: str = None) -> bool:
+        """Check if the password is valid, raise LoginThrottled if there
+        were too many failed attempts from the IP address or on the email
+        """
+        wait = self._login_throttle.attempt(ip, email or '')
+        if wait > 0:
+            raise LoginThrottled(wait)
+        try:
+            existing_user = await self._db.find_user_by(email=email)
+        except NoResultFound:
+            return False
+        valid = await self._hashing_pool.run_async(
+            _check_password, password, existing_user.hashed_password)
+        if valid:
+            self._login_throttle.succeeded(ip, email)
+        return valid
+
+    async def create_session(self, email: str) -> str:
+        """ Create session id for user"""
+        id = _generate_uuid()
+        try:
+            if await self._db.update_user_by({"email": email}, session_id=id):
+                self._session_cache.invalidate_user(email=email)
+                return id
+            return
+        except ValueError:
+            return
+
+    async def get_user_from_session_id(
+            self,
+            session_id: str) -> Optional[User]:
+        """ Get user from session_id. """
+        try:
+            return await self._db.find_user_by(session_id=session_id)
+        except NoResultFound:
+            return
+
+    async def session_user(self, session_id: str) -> Optional[UserSnapshot]:
+        """ ID and email of the user of a session, read through the
+        session cache """
+        if session_id is None:
+            return
+        snapshot = self._session_cache.get(session_id)
+        if snapshot is not None:
+            return snapshot
+        generation = self._session_cache.generation
+        user = await self.get_user_from_session_id(session_id)
+        if user is None:
+            return
+        snapshot = UserSnapshot(user.id, user.email)
+        self._session_cache.put(session_id, snapshot, generation)
+        return snapshot
+
+    async def destroy_session(self, user_id: int) -> None:
+        """ Destroys the session associated with the given user """
+        await self._db.update_user(user_id=user_id, session_id=None)
+        self._session_cache.invalidate_user(user_id=user_id)
+
+    async def get_reset_password_token(self, email: str) -> str:
+        """ Creates and returns the reset password token. """
+        u_id = _generate_uuid()
+        if not await self._db.update_user_by({"email": email},
+                                             reset_token=u_id):
+            raise ValueError()
+        return u_id
+
+    async def update_password(self, reset_token: str, password: str) -> None:
+        """ Update password. """
+        try:
+            user = await self._db.find_user_by(reset_token=reset_token)
+        except NoResultFound:
+            raise ValueError()
+        hashed_password = await self._hashing_pool.run_async(
+            _hash_password, password)
+        await self._db.update_user(
+            user.id,
+            hashed_password=hashed_password,
+            reset_token=None)
+        self._session_cache.invalidate_user(user_id=user.id)
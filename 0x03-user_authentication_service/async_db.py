@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Async DB module
+"""
+from os import getenv
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm.exc import NoResultFound
+
+from db import DB, USER_COLUMNS, migrate_indexes
+from user import Base, User
+
+
+class AsyncDB:
+    """AsyncDB class: same API as DB, with coroutines
+    """
+
+    def __init__(self, busy_timeout: float = 5.0) -> None:
+        """Initialize a new AsyncDB instance, call migrate() before use
+        """
+        self._engine = create_async_engine(
+            "sqlite+aiosqlite:///a.db", echo=False,
+            connect_args={"timeout": busy_timeout})
+        event.listen(self._engine.sync_engine, "connect",
+                     DB._tune_connection)
+        # objects stay usable after the session that loaded them closed
+        self._sessionmaker = async_sessionmaker(
+            self._engine, expire_on_commit=False)
+
+    async def migrate(self) -> None:
+        """Create the missing tables and indexes, keeping existing rows
+        """
+        async with self._engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.run_sync(migrate_indexes)
+
+    async def close(self) -> None:
+        """Close all connections
+        """
+        await self._engine.dispose()
+
+    async def add_user(self, email: str, hashed_password: str) -> User:
+        """Add a user to the database"""
+        new_user = User(email=email, hashed_password=hashed_password)
+        async with self._sessionmaker() as session:
+            session.add(new_user)
+            try:
+                await session.commit()
+            except IntegrityError:
+                await session.rollback()
+                raise
+
+        return new_user
+
+    async def find_user_by(self, **kwargs) -> User:
+        """ Find user by keyword arguments"""
+        async with self._sessionmaker() as session:
+            result = await session.execute(
+                select(User).filter_by(**kwargs).limit(1))
+            first_row = result.scalars().first()
+
+        if first_row is None:
+            raise NoResultFound()
+
+        return first_row
+
+    async def update_user(self, user_id: int, **kwargs) -> None:
+        """ Update user"""
+        await self.update_user_by({"id": user_id}, **kwargs)
+
+    async def update_user_by(self, criteria: dict, **kwargs) -> int:
+        """ Update the users matching criteria with a single UPDATE,
+        return the number of updated users"""
+        for key in list(criteria) + list(kwargs):
+            if key not in USER_COLUMNS:
+                raise ValueError(f"Invalid attribute: {key}")
+        if not kwargs:
+            return 0
+        async with self._sessionmaker() as session:
+            result = await session.execute(
+                update(User).filter_by(**criteria).values(**kwargs))
+            await session.commit()
+        return result.rowcount
+
+
+def async_db_from_env() -> AsyncDB:
+    """ AsyncDB configured by DB_BUSY_TIMEOUT """
+    return AsyncDB(float(getenv('DB_BUSY_TIMEOUT', 5)))
@@ -4,10 +4,17 @@ from bcrypt import gensalt, hashpw, checkpw
 from typing import Optional
 from uuid import uuid4
 from user import User
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
 
-from db import DB
+from db import db_from_env
+from hashing_pool import HashingPool
+from login_throttle import LoginThrottled, login_throttle_from_env
+from metrics import timed
+from session_cache import UserSnapshot, session_cache_from_env
+
+AUTH_SECONDS = ('auth_seconds', 'Time spent in authentication steps')
 
 
 def _hash_password(password: str) -> bytes:
@@ -18,6 +25,11 @@ def _hash_password(password: str) -> bytes:
     return hash
 
 
+def _check_password(password: str, hashed_password: bytes) -> bool:
+    """Check a password against its hash"""
+    return checkpw(password.encode(), hashed_password)
+
+
 def _generate_uuid() -> str:
     """ Generate a unique and return as string"""
     return str(uuid4())
@@ -28,8 +40,24 @@ class Auth:
     """
 
     def __init__(self):
-        self._db = DB()
+        self._db = db_from_env()
+        self._hashing_pool = HashingPool()
+        self._session_cache = session_cache_from_env()
+        self._login_throttle = login_throttle_from_env()
+
+    def hashing_stats(self) -> dict:
+        """ Queue depth and latency of password hashing """
+        return self._hashing_pool.stats()
 
+    def session_cache_stats(self) -> dict:
+        """ Size and hit/miss counters of the session cache """
+        return self._session_cache.stats()
+
+    def close_session(self) -> None:
+        """ Release the database session of the current thread """
+        self._db.close_session()
+
+    @timed(*AUTH_SECONDS, step='register_user')
     def register_user(self, email: str, password: str) -> User:
         """ Adds a user to the database with validation"""
         try:
@@ -37,38 +65,49 @@ class Auth:
             if existing_user:
                 raise ValueError("User {} already exists.".format(email))
         except NoResultFound:
-            password_hash = _hash_password(password)
-
-            new_user = self._db.add_user(email, password_hash)
+            password_hash = self._hashing_pool.run(_hash_password, password)
+            try:
+                new_user = self._db.add_user(email, password_hash)
+            except IntegrityError:
+                # registered concurrently since the lookup
+                raise ValueError("User {} already exists.".format(email))
             return new_user
 
-    def valid_login(self, email: str, password: str) -> bool:
-        """Check if the password is valid"""
+    @timed(*AUTH_SECONDS, step='valid_login')
+    def valid_login(self, email: str, password: str,
+                    ip: str = None) -> bool:
+        """Check if the password is valid, raise LoginThrottled if there
+        were too many failed attempts from the IP address or on the email
+        """
+        # throttled before any lookup or password hashing
+        wait = self._login_throttle.attempt(ip, email or '')
+        if wait > 0:
+            raise LoginThrottled(wait)
         try:
             existing_user = self._db.find_user_by(email=email)
-            valid = checkpw(
-                password.encode(),
-                existing_user.hashed_password)
+            valid = self._hashing_pool.run(
+                _check_password, password, existing_user.hashed_password)
             if valid:
+                self._login_throttle.succeeded(ip, email)
                 return True
             return False
 
         except NoResultFound:
             return False
 
+    @timed(*AUTH_SECONDS, step='create_session')
     def create_session(self, email: str) -> str:
         """ Create session id for user"""
         id = _generate_uuid()
         try:
-            user = self._db.find_user_by(email=email)
-
-            self._db.update_user(user.id, session_id=id)
-            return id
-        except NoResultFound:
+            if self._db.update_user_by({"email": email}, session_id=id):
+                self._session_cache.invalidate_user(email=email)
+                return id
             return
         except ValueError:
             return
 
+    @timed(*AUTH_SECONDS, step='get_user_from_session_id')
     def get_user_from_session_id(
             self,
             session_id: str) -> Optional[User]:
@@ -82,10 +121,30 @@ class Auth:
         except NoResultFound:
             return
 
+    @timed(*AUTH_SECONDS, step='session_user')
+    def session_user(self, session_id: str) -> Optional[UserSnapshot]:
+        """ ID and email of the user of a session, read through the
+        session cache """
+        if session_id is None:
+            return
+        snapshot = self._session_cache.get(session_id)
+        if snapshot is not None:
+            return snapshot
+        generation = self._session_cache.generation
+        user = self.get_user_from_session_id(session_id)
+        if user is None:
+            return
+        snapshot = UserSnapshot(user.id, user.email)
+        self._session_cache.put(session_id, snapshot, generation)
+        return snapshot
+
+    @timed(*AUTH_SECONDS, step='destroy_session')
     def destroy_session(self, user_id: int) -> None:
         """ Destroys the session associated with the given user """
         self._db.update_user(user_id=user_id, session_id=None)
+        self._session_cache.invalidate_user(user_id=user_id)
 
+    @timed(*AUTH_SECONDS, step='get_reset_password_token')
     def get_reset_password_token(self, email: str) -> str:
         """ Creates and returns the reset password token. """
         try:
@@ -96,15 +155,18 @@ class Auth:
         except NoResultFound:
             raise ValueError()
 
+    @timed(*AUTH_SECONDS, step='update_password')
     def update_password(self, reset_token: str, password: str) -> None:
         """ Update password. """
         try:
             user = self._db.find_user_by(reset_token=reset_token)
-            hashed_password = _hash_password(password)
+            hashed_password = self._hashing_pool.run(
+                _hash_password, password)
             self._db.update_user(
                 user.id,
                 hashed_password=hashed_password,
                 reset_token=None)
+            self._session_cache.invalidate_user(user_id=user.id)
 
         except NoResultFound:
             raise ValueError()
@@ -1,43 +1,119 @@
 #!/usr/bin/env python3
 """DB module
 """
-from sqlalchemy import create_engine
+from os import getenv
+from sqlalchemy import create_engine, event, func, inspect, select, update
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.session import Session
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
 from sqlalchemy.orm.exc import NoResultFound
 
 from user import Base, User
 
+USER_COLUMNS = frozenset(column.name for column in User.__table__.columns)
+
+
+def check_unique(connection: Connection, index) -> None:
+    """Raise a ValueError naming the values that appear in more than one
+    row covered by a unique index
+    """
+    columns = list(index.columns)
+    query = select(*columns).group_by(*columns).having(func.count() > 1)
+    where = index.dialect_options["sqlite"]["where"]
+    if where is not None:
+        query = query.where(where)
+    duplicates = connection.execute(query.limit(10)).all()
+    if duplicates:
+        names = ", ".join(column.name for column in columns)
+        values = ", ".join(repr(tuple(row) if len(row) > 1 else row[0])
+                           for row in duplicates)
+        raise ValueError(f"Cannot create unique index {index.name}: "
+                         f"duplicate {names}: {values}")
+
+
+def migrate_indexes(connection: Connection) -> None:
+    """Create the indexes missing from existing tables, checking first
+    that the rows fit the unique ones
+    """
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"]
+                    for index in inspect(connection).get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            if index.unique:
+                check_unique(connection, index)
+            index.create(bind=connection)
+
 
 class DB:
     """DB class
     """
 
-    def __init__(self) -> None:
+    def __init__(self, pool_size: int = 5, max_overflow: int = 10,
+                 pool_pre_ping: bool = True,
+                 busy_timeout: float = 5.0) -> None:
         """Initialize a new DB instance
+
+        Each thread gets its own session, taken from a pool of at most
+        pool_size + max_overflow connections.
+        """
+        self._engine = create_engine(
+            "sqlite:///a.db", echo=False,
+            pool_size=pool_size, max_overflow=max_overflow,
+            pool_pre_ping=pool_pre_ping,
+            connect_args={"check_same_thread": False,
+                          "timeout": busy_timeout})
+        event.listen(self._engine, "connect", self._tune_connection)
+        self.migrate()
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
+
+    def migrate(self) -> None:
+        """Create the missing tables and indexes, keeping existing rows
+        """
+        with self._engine.begin() as connection:
+            Base.metadata.create_all(connection)
+            migrate_indexes(connection)
+
+    def reset(self) -> None:
+        """Drop all tables and recreate them empty
         """
-        self._engine = create_engine("sqlite:///a.db", echo=False)
+        self.close_session()
         Base.metadata.drop_all(self._engine)
-        Base.metadata.create_all(self._engine)
-        self.__session = None
+        self.migrate()
+
+    @staticmethod
+    def _tune_connection(dbapi_connection, connection_record) -> None:
+        """Let readers and a writer work concurrently on new connections
+        """
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
 
     @property
     def _session(self) -> Session:
-        """Memoized session object
+        """Session object of the current thread
+        """
+        return self.__session()
+
+    def close_session(self) -> None:
+        """Close the session of the current thread
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Add a user to the database"""
         new_user = User(email=email, hashed_password=hashed_password)
         session = self._session
         session.add(new_user)
-        session.commit()
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()
+            raise
 
         return new_user
 
@@ -55,18 +131,27 @@ class DB:
 
     def update_user(self, user_id: int, **kwargs) -> None:
         """ Update user"""
-        try:
-            user = self.find_user_by(id=user_id)
-            if not user:
-                return
-
-            valid_attributes = [
-                column.name for column in User.__table__.columns]
-            for key, value in kwargs.items():
-                if key in valid_attributes:
-                    setattr(user, key, value)
-                else:
-                    raise ValueError(f"Invalid attribute: {key}")
-            self.__session.commit()
-        except NoResultFound:
-            return
+        self.update_user_by({"id": user_id}, **kwargs)
+
+    def update_user_by(self, criteria: dict, **kwargs) -> int:
+        """ Update the users matching criteria with a single UPDATE,
+        return the number of updated users"""
+        for key in list(criteria) + list(kwargs):
+            if key not in USER_COLUMNS:
+                raise ValueError(f"Invalid attribute: {key}")
+        if not kwargs:
+            return 0
+        session = self._session
+        result = session.execute(
+            update(User).filter_by(**criteria).values(**kwargs))
+        session.commit()
+        return result.rowcount
+
+
+def db_from_env() -> DB:
+    """ DB configured by DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING
+    and DB_BUSY_TIMEOUT """
+    return DB(int(getenv('DB_POOL_SIZE', 5)),
+              int(getenv('DB_MAX_OVERFLOW', 10)),
+              getenv('DB_POOL_PRE_PING', '1') not in ('', '0'),
+              float(getenv('DB_BUSY_TIMEOUT', 5)))
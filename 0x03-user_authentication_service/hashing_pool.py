@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+""" Hashing pool module. """
+from asyncio import wrap_future
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_all_start_methods, get_context
+from os import cpu_count
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from typing import Any, Callable, Dict, Optional
+
+
+class HashingPoolFull(Exception):
+    """ Raised when the hashing pool can't take more work. """
+
+
+class HashingPoolBroken(HashingPoolFull):
+    """ Raised when the workers keep dying, even in a new pool. """
+
+
+class HashingPool:
+    """ Runs CPU bound password hashing in worker processes, with at
+    most max_pending calls queued or running at once. Workers are
+    started by a fork server (spawned where there is none): forking the
+    threaded server process could deadlock them. A pool whose worker
+    died is replaced, and its calls run again once. """
+    LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, workers: Optional[int] = None,
+                 max_pending: Optional[int] = None) -> None:
+        """ Initialize the pool, by default one worker per core """
+        self.workers = workers or cpu_count() or 1
+        self.max_pending = max_pending or 4 * self.workers
+        self._executor = self._new_executor()
+        self._restarts = 0
+        self._slots = BoundedSemaphore(self.max_pending)
+        self._lock = Lock()
+        self._pending = 0
+        self._rejected = 0
+        self._latency_count = 0
+        self._latency_sum = 0.0
+        self._latency_buckets = [0] * (len(self.LATENCY_BUCKETS_MS) + 1)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        """ A process pool whose workers aren't forked from this process """
+        method = 'forkserver' \
+            if 'forkserver' in get_all_start_methods() else 'spawn'
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=get_context(method))
+
+    def _current(self, broken: Optional[ProcessPoolExecutor] = None
+                 ) -> ProcessPoolExecutor:
+        """ The current pool, replaced first if it is broken """
+        with self._lock:
+            if broken is None or self._executor is not broken:
+                return self._executor
+            self._executor = self._new_executor()
+            self._restarts += 1
+            executor = self._executor
+        broken.shutdown(wait=False)
+        return executor
+
+    def _acquire(self) -> float:
+        """ Take a slot or raise HashingPoolFull, return the start time """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingPoolFull()
+        with self._lock:
+            self._pending += 1
+        return perf_counter()
+
+    def _release(self, start: float) -> None:
+        """ Give back a slot and record the latency of its call """
+        elapsed = (perf_counter() - start) * 1000
+        with self._lock:
+            self._pending -= 1
+            self._latency_count += 1
+            self._latency_sum += elapsed
+            self._latency_buckets[
+                bisect_left(self.LATENCY_BUCKETS_MS, elapsed)] += 1
+        self._slots.release()
+
+    def run(self, function: Callable, *args: Any) -> Any:
+        """ Run function(*args) in a worker and return its result,
+        raise HashingPoolFull right away if the pool is saturated, and
+        HashingPoolBroken if the worker dies again in a new pool """
+        start = self._acquire()
+        broken = error = None
+        try:
+            for _ in range(2):
+                executor = self._current(broken)
+                try:
+                    return executor.submit(function, *args).result()
+                except BrokenProcessPool as e:
+                    broken, error = executor, e
+            raise HashingPoolBroken() from error
+        finally:
+            self._release(start)
+
+    async def run_async(self, function: Callable, *args: Any) -> Any:
+        """ Same as run, awaiting the result instead of blocking """
+        start = self._acquire()
+        broken = error = None
+        try:
+            for _ in range(2):
+                executor = self._current(broken)
+                try:
+                    return await wrap_future(
+                        executor.submit(function, *args))
+                except BrokenProcessPool as e:
+                    broken, error = executor, e
+            raise HashingPoolBroken() from error
+        finally:
+            self._release(start)
+
+    def stats(self) -> Dict[str, Any]:
+        """ Queue depth and latency of the hashing calls """
+        with self._lock:
+            buckets = {
+                str(bound): count for bound, count in
+                zip(self.LATENCY_BUCKETS_MS + ('+Inf',),
+                    self._latency_buckets)}
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "rejected": self._rejected,
+                "restarts": self._restarts,
+                "latency_ms": {
+                    "count": self._latency_count,
+                    "sum": self._latency_sum,
+                    "buckets": buckets,
+                },
+            }
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+""" Login throttling: token buckets per IP address and per account """
+from collections import OrderedDict
+from os import getenv
+from threading import Lock
+from time import monotonic
+
+
+class LoginThrottled(Exception):
+    """ Raised when a login attempt must wait retry_after seconds. """
+
+    def __init__(self, retry_after: float) -> None:
+        """ Initialize with the seconds to wait """
+        super().__init__(retry_after)
+        self.retry_after = retry_after
+
+
+class TokenBuckets:
+    """ Token buckets by key, each holding up to burst tokens and gaining
+    rate tokens per second. Full buckets are forgotten, and at most
+    max_keys buckets are kept, the least recently used going first """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100000):
+        """ Initialize, burst 0 disables the buckets """
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.__lock = Lock()
+        self.__buckets = OrderedDict()
+
+    def __tokens(self, key: str, now: float) -> float:
+        """ Tokens of a bucket at now, lock held """
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            return self.burst
+        tokens, updated_at = bucket
+        return min(self.burst, tokens + (now - updated_at) * self.rate)
+
+    def take(self, key: str, now: float) -> float:
+        """ Take a token: return 0, or the seconds until a token is
+        available if the bucket is empty """
+        if self.burst <= 0:
+            return 0
+        with self.__lock:
+            tokens = self.__tokens(key, now)
+            if tokens < 1:
+                return (1 - tokens) / self.rate if self.rate > 0 else 3600
+            self.__buckets[key] = (tokens - 1, now)
+            self.__buckets.move_to_end(key)
+            while len(self.__buckets) > self.max_keys:
+                self.__buckets.popitem(last=False)
+        return 0
+
+    def give(self, key: str, now: float) -> None:
+        """ Give a token back """
+        if self.burst <= 0:
+            return
+        with self.__lock:
+            tokens = self.__tokens(key, now) + 1
+            if tokens >= self.burst:
+                self.__buckets.pop(key, None)
+            else:
+                self.__buckets[key] = (tokens, now)
+
+    def __len__(self) -> int:
+        """ Number of buckets not full """
+        return len(self.__buckets)
+
+
+class LoginThrottle:
+    """ Each login attempt takes a token from the bucket of its IP address
+    and from the bucket of its account, a successful one gives them
+    back: only failed attempts are limited """
+
+    def __init__(self, ip_buckets: TokenBuckets,
+                 account_buckets: TokenBuckets):
+        """ Initialize """
+        self.ip_buckets = ip_buckets
+        self.account_buckets = account_buckets
+
+    def attempt(self, ip: str, email: str) -> float:
+        """ Return 0 if the attempt can go on, else the seconds to wait;
+        a refused attempt takes no token """
+        now = monotonic()
+        wait = self.ip_buckets.take(ip or '', now)
+        if wait > 0:
+            return wait
+        wait = self.account_buckets.take(email.lower(), now)
+        if wait > 0:
+            self.ip_buckets.give(ip or '', now)
+        return wait
+
+    def succeeded(self, ip: str, email: str) -> None:
+        """ Give back the tokens of a successful attempt """
+        now = monotonic()
+        self.ip_buckets.give(ip or '', now)
+        self.account_buckets.give(email.lower(), now)
+
+
+def login_throttle_from_env() -> LoginThrottle:
+    """ LoginThrottle configured by LOGIN_IP_RATE, LOGIN_IP_BURST,
+    LOGIN_ACCOUNT_RATE and LOGIN_ACCOUNT_BURST """
+    return LoginThrottle(
+        TokenBuckets(float(getenv('LOGIN_IP_RATE', 1)),
+                     int(getenv('LOGIN_IP_BURST', 20))),
+        TokenBuckets(float(getenv('LOGIN_ACCOUNT_RATE', 0.1)),
+                     int(getenv('LOGIN_ACCOUNT_BURST', 5))))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+""" Session cache module. """
+from collections import OrderedDict
+from os import getenv
+from threading import Lock
+from time import monotonic
+from typing import NamedTuple, Optional
+
+
+class UserSnapshot(NamedTuple):
+    """ What a request needs to know about the user of a session. """
+    id: int
+    email: str
+
+
+class SessionCache:
+    """ Bounded LRU cache from session ID to UserSnapshot. Entries expire
+    after ttl seconds, which bounds how long another process can serve a
+    session it didn't see destroyed. """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60) -> None:
+        """ Initialize the cache, max_size 0 disables it """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._session_by_user_id = {}
+        self._session_by_email = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def generation(self) -> int:
+        """ Changes on every invalidation: a snapshot read from the
+        database before is only cached if it didn't change since """
+        return self._generation
+
+    def get(self, session_id: str) -> Optional[UserSnapshot]:
+        """ Cached snapshot of the user of a session, None on a miss """
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry[1] > monotonic():
+                self._entries.move_to_end(session_id)
+                self._hits += 1
+                return entry[0]
+            if entry is not None:
+                self._drop(session_id)
+            self._misses += 1
+            return None
+
+    def put(self, session_id: str, snapshot: UserSnapshot,
+            generation: int) -> None:
+        """ Cache the snapshot of the user of a session, read from the
+        database at generation """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            # a user has one session: its previous one is gone
+            for sessions, key in ((self._session_by_user_id, snapshot.id),
+                                  (self._session_by_email, snapshot.email)):
+                previous = sessions.get(key)
+                if previous is not None and previous != session_id:
+                    self._drop(previous)
+            self._entries[session_id] = (snapshot, monotonic() + self.ttl)
+            self._entries.move_to_end(session_id)
+            self._session_by_user_id[snapshot.id] = session_id
+            self._session_by_email[snapshot.email] = session_id
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: Optional[int] = None,
+                        email: Optional[str] = None) -> None:
+        """ Forget the cached session of a user, by ID or email """
+        with self._lock:
+            self._generation += 1
+            for sessions, key in ((self._session_by_user_id, user_id),
+                                  (self._session_by_email, email)):
+                session_id = sessions.get(key)
+                if key is not None and session_id is not None:
+                    self._drop(session_id)
+
+    def _drop(self, session_id: str) -> None:
+        """ Remove an entry and its reverse mappings, lock held """
+        snapshot = self._entries.pop(session_id)[0]
+        if self._session_by_user_id.get(snapshot.id) == session_id:
+            del self._session_by_user_id[snapshot.id]
+        if self._session_by_email.get(snapshot.email) == session_id:
+            del self._session_by_email[snapshot.email]
+
+    def stats(self) -> dict:
+        """ Size and hit/miss counters """
+        with self._lock:
+            return {"size": len(self._entries),
+                    "hits": self._hits,
+                    "misses": self._misses}
+
+
+def session_cache_from_env() -> SessionCache:
+    """ SessionCache sized by SESSION_CACHE_SIZE and SESSION_CACHE_TTL """
+    return SessionCache(int(getenv('SESSION_CACHE_SIZE', 10000)),
+                        float(getenv('SESSION_CACHE_TTL', 60)))
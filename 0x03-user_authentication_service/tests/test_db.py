@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+""" Tests of db
+"""
+from db import DB, db_from_env
+from sqlalchemy import inspect, text
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+
+class TestMigrate(unittest.TestCase):
+    """ DB.migrate on a database created before the indexes
+    """
+
+    def setUp(self):
+        """ Work in a directory holding an unindexed users table
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+        with sqlite3.connect("a.db") as connection:
+            connection.execute(
+                "CREATE TABLE users (id INTEGER PRIMARY KEY, "
+                "email VARCHAR(250) NOT NULL, "
+                "hashed_password VARCHAR(250) NOT NULL, "
+                "session_id VARCHAR(250), reset_token VARCHAR(250))")
+        connection.close()
+
+    def tearDown(self):
+        """ Back to the original directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    @staticmethod
+    def insert(*rows):
+        """ Insert (email, session_id) users
+        """
+        with sqlite3.connect("a.db") as connection:
+            connection.executemany(
+                "INSERT INTO users (email, hashed_password, session_id) "
+                "VALUES (?, 'x', ?)", rows)
+        connection.close()
+
+    def test_indexes_created(self):
+        """ Existing rows are kept and the indexes created
+        """
+        self.insert(("a@a.com", None), ("b@b.com", None), ("c@c.com", "s"))
+        db = DB()
+        names = {index["name"]
+                 for index in inspect(db._engine).get_indexes("users")}
+        self.assertEqual(names, {"ix_users_email", "ix_users_session_id",
+                                 "ix_users_reset_token"})
+        self.assertEqual(db.find_user_by(session_id="s").email, "c@c.com")
+        DB()
+
+    def test_duplicate_emails(self):
+        """ Duplicate emails are named instead of failing mid-migration
+        """
+        self.insert(("a@a.com", None), ("b@b.com", None),
+                    ("a@a.com", None), ("b@b.com", None), ("c@c.com", None))
+        with self.assertRaises(ValueError) as error:
+            DB()
+        message = str(error.exception)
+        self.assertIn("ix_users_email", message)
+        self.assertIn("'a@a.com'", message)
+        self.assertIn("'b@b.com'", message)
+        self.assertNotIn("c@c.com", message)
+
+    def test_partial_index_ignores_nulls(self):
+        """ Rows without a session ID don't count as duplicates
+        """
+        self.insert(("a@a.com", None), ("b@b.com", None))
+        DB()
+        with sqlite3.connect("a.db") as connection:
+            connection.execute("DROP INDEX ix_users_session_id")
+        connection.close()
+        self.insert(("c@c.com", "s"), ("d@d.com", "s"))
+        with self.assertRaisesRegex(ValueError, "ix_users_session_id"):
+            DB()
+
+
+class TestDBFromEnv(unittest.TestCase):
+    """ db_from_env
+    """
+
+    def setUp(self):
+        """ Work in an empty directory
+        """
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        """ Back to the original directory
+        """
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    @patch.dict(os.environ, {"DB_POOL_SIZE": "2", "DB_MAX_OVERFLOW": "3",
+                             "DB_POOL_PRE_PING": "0",
+                             "DB_BUSY_TIMEOUT": "0.25"})
+    def test_settings(self):
+        """ The pool and the connections follow the environment
+        """
+        db = db_from_env()
+        pool = db._engine.pool
+        self.assertEqual((pool.size(), pool._max_overflow), (2, 3))
+        self.assertFalse(pool._pre_ping)
+        with db._engine.connect() as connection:
+            busy_timeout = connection.execute(
+                text("PRAGMA busy_timeout")).scalar()
+        self.assertEqual(busy_timeout, 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """ User Model Module"""
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Index, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -15,3 +15,12 @@ class User(Base):
     hashed_password: str = Column(String(250), nullable=False)
     session_id: str = Column(String(250))
     reset_token: str = Column(String(250))
+
+    __table_args__ = (
+        Index('ix_users_email', email, unique=True),
+        # most users have neither: only index the rows that do
+        Index('ix_users_session_id', session_id, unique=True,
+              sqlite_where=session_id.isnot(None)),
+        Index('ix_users_reset_token', reset_token, unique=True,
+              sqlite_where=reset_token.isnot(None)),
+    )
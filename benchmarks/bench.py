@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+""" Benchmark suite for the Basic auth (0x01), Session auth (0x02) and
+user authentication service (0x03) APIs.
+
+Each run populates a temporary store with synthetic users, then drives
+the service either in-process through the Flask test client or
+out-of-process through HTTP against a local server, and reports
+throughput and p50/p99 latency per endpoint as JSON. The memory mode
+reports the peak RSS of loading the users, then of building them all.
+
+    $ python3 benchmarks/bench.py --users 1000 10000 --output results.json
+    $ python3 benchmarks/bench.py --services basic --modes memory \
+          --layouts dict compact --users 1000000
+"""
+import argparse
+import base64
+import gc
+import hashlib
+import http.client
+import json
+import os
+import platform
+import resource
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.parse
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMAIL_FORMAT = "user{}@bench.io"
+PASSWORD = "b3nchm4rk"
+TIMESTAMP = "2023-08-08T23:30:00"
+
+SERVICES = {
+    'basic': {
+        'project': '0x01-Basic_authentication',
+        'app': 'api.v1.app',
+        'env': {'AUTH_TYPE': 'basic_auth'},
+    },
+    'session': {
+        'project': '0x02-Session_authentication',
+        'app': 'api.v1.app',
+        'env': {'AUTH_TYPE': 'session_auth',
+                'SESSION_NAME': '_my_session_id'},
+    },
+    'user_service': {
+        'project': '0x03-user_authentication_service',
+        'app': 'app',
+        'env': {},
+    },
+}
+
+# COMPACT_MODELS of each model layout, for 0x01 and 0x02
+LAYOUTS = {'dict': '0', 'compact': '1'}
+# objects whose allocations are traced in the memory mode
+MEMORY_SAMPLE = 10000
+
+Endpoint = Tuple[str, str, str, Dict[str, str], str]
+
+
+def populate_models(directory: str, users: int) -> None:
+    """ Write users directly into .db_User.json (0x01, 0x02) """
+    password = hashlib.sha256(PASSWORD.encode()).hexdigest().lower()
+    objs_json = {}
+    for i in range(users):
+        obj_id = str(uuid.UUID(int=i))
+        objs_json[obj_id] = {
+            "id": obj_id, "created_at": TIMESTAMP, "updated_at": TIMESTAMP,
+            "email": EMAIL_FORMAT.format(i), "_password": password,
+            "first_name": None, "last_name": None}
+    with open(os.path.join(directory, '.db_User.json'), 'w') as f:
+        json.dump(objs_json, f)
+
+
+def populate_sqlite(directory: str, users: int) -> None:
+    """ Write users directly into a.db (0x03), the schema being created
+    by the service's own DB class """
+    import bcrypt
+    subprocess.run([sys.executable, '-c', 'from db import DB; DB()'],
+                   cwd=directory, env=service_env('user_service'),
+                   check=True)
+    # one bcrypt hash for everyone: hashing 1M passwords takes days
+    hashed = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt())
+    connection = sqlite3.connect(os.path.join(directory, 'a.db'))
+    with connection:
+        connection.executemany(
+            "INSERT INTO users (email, hashed_password) VALUES (?, ?)",
+            ((EMAIL_FORMAT.format(i), hashed) for i in range(users)))
+    connection.close()
+
+
+def service_env(service: str, layout: str = 'dict') -> Dict[str, str]:
+    """ Environment running a service from its project directory """
+    env = dict(os.environ)
+    env.update(SERVICES[service]['env'])
+    env['PYTHONPATH'] = os.path.join(ROOT, SERVICES[service]['project'])
+    env['COMPACT_MODELS'] = LAYOUTS[layout]
+    return env
+
+
+def max_rss_mib() -> float:
+    """ Peak resident set size of this process, in MiB """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(max_rss / (1024 ** 2 if sys.platform == 'darwin'
+                            else 1024), 1)
+
+
+def rss_mib() -> float:
+    """ Current resident set size of this process, in MiB, None where
+    /proc isn't available """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return round(pages * resource.getpagesize() / 1024 ** 2, 1)
+
+
+def process_max_rss_mib(pid: int) -> float:
+    """ Peak resident set size of a running process, in MiB, None where
+    /proc isn't available """
+    try:
+        with open('/proc/{}/status'.format(pid)) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def basic_header(i: int) -> Dict[str, str]:
+    """ Authorization header of a synthetic user """
+    credentials = "{}:{}".format(EMAIL_FORMAT.format(i), PASSWORD)
+    return {'Authorization': 'Basic ' +
+            base64.b64encode(credentials.encode()).decode()}
+
+
+def login_endpoint(service: str, users: int) -> Endpoint:
+    """ (name, method, path, headers, body) logging the user in the
+    middle of the table in, None if the service has no login """
+    path = {'session': '/api/v1/auth_session/login/',
+            'user_service': '/sessions/'}.get(service)
+    if path is None:
+        return None
+    return ('POST ' + path, 'POST', path,
+            {'Content-Type': 'application/x-www-form-urlencoded'},
+            urllib.parse.urlencode({'email': EMAIL_FORMAT.format(users // 2),
+                                    'password': PASSWORD}))
+
+
+def endpoints(service: str, users: int, cookie: str = None) -> List[Endpoint]:
+    """ (name, method, path, headers, body) of the authenticated requests
+    of the user in the middle of the table, cookie being its session """
+    middle = users // 2
+    if service == 'basic':
+        return [
+            ('GET /api/v1/users?limit=100', 'GET',
+             '/api/v1/users?limit=100', basic_header(middle), None),
+            ('GET /api/v1/users/:id', 'GET',
+             '/api/v1/users/{}'.format(uuid.UUID(int=middle)),
+             basic_header(middle), None),
+        ]
+    if service == 'session':
+        session = {'Cookie': '_my_session_id={}'.format(cookie)}
+        return [
+            ('GET /api/v1/users/me', 'GET', '/api/v1/users/me',
+             session, None),
+            ('GET /api/v1/users?limit=100', 'GET',
+             '/api/v1/users?limit=100', session, None),
+        ]
+    return [
+        ('GET /profile/', 'GET', '/profile/',
+         {'Cookie': 'session_id={}'.format(cookie)}, None),
+    ]
+
+
+def session_cookie(headers) -> str:
+    """ Value of the cookie set by a login response """
+    return headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+
+
+def summarize(name: str, latencies: List[float], errors: int,
+              elapsed: float) -> dict:
+    """ Throughput and latency percentiles of an endpoint """
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'endpoint': name,
+        'requests': count,
+        'errors': errors,
+        'throughput_rps': round(count / elapsed, 1),
+        'p50_ms': round(latencies[count // 2] * 1000, 3),
+        'p99_ms': round(latencies[min(count - 1, int(count * 0.99))] * 1000,
+                        3),
+    }
+
+
+def run_endpoints(service: str, users: int,
+                  benchmark: Callable[..., dict],
+                  login: Callable[[Endpoint], str]) -> List[dict]:
+    """ Benchmark the login first, as a login replaces the 0x03 session,
+    then the authenticated requests with a session opened afterwards """
+    results = []
+    cookie = None
+    endpoint = login_endpoint(service, users)
+    if endpoint is not None:
+        results.append(benchmark(*endpoint))
+        cookie = login(endpoint)
+    for endpoint in endpoints(service, users, cookie):
+        results.append(benchmark(*endpoint))
+    return results
+
+
+def run_in_process(service: str, users: int, requests: int) -> List[dict]:
+    """ Worker side: drive the app through the Flask test client """
+    app = __import__(SERVICES[service]['app'], fromlist=['app']).app
+    client = app.test_client()
+
+    def benchmark(name, method, path, headers, body):
+        # the test client sends back the cookies it received itself
+        headers = {k: v for k, v in headers.items() if k != 'Cookie'}
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            t = time.perf_counter()
+            response = client.open(path, method=method, headers=headers,
+                                   data=body)
+            latencies.append(time.perf_counter() - t)
+            errors += response.status_code >= 400
+        return summarize(name, latencies, errors,
+                         time.perf_counter() - start)
+
+    def login(endpoint):
+        _, method, path, headers, body = endpoint
+        return session_cookie(client.open(
+            path, method=method, headers=headers, data=body).headers)
+
+    results = run_endpoints(service, users, benchmark, login)
+    for result in results:
+        result['max_rss_mib'] = max_rss_mib()
+    return results
+
+
+def run_memory(service: str, users: int) -> List[dict]:
+    """ Worker side: RSS once the users are loaded, then once they are
+    all built and held (0x01, 0x02). Parsing the file makes the peak,
+    and the memory it frees is reused rather than given back, so the
+    memory allocated per built object is measured too, on a sample
+    (tracing all the allocations would take 10 times longer) """
+    start = time.perf_counter()
+    __import__(SERVICES[service]['app'], fromlist=['app'])
+    loaded = time.perf_counter() - start
+    gc.collect()
+    loaded_rss = rss_mib()
+    from models.user import User
+    sample = User.page_ids(limit=MEMORY_SAMPLE)
+    tracemalloc.start()
+    objs = [User.get(obj_id) for obj_id in sample]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    objs = User.all()
+    built = time.perf_counter() - start
+    gc.collect()
+    return [{
+        'endpoint': 'memory',
+        'objects': len(objs),
+        'load_seconds': round(loaded, 3),
+        'build_seconds': round(built, 3),
+        'object_bytes': round(allocated / max(1, len(sample))),
+        'loaded_rss_mib': loaded_rss,
+        'built_rss_mib': rss_mib(),
+        'max_rss_mib': max_rss_mib(),
+    }]
+
+
+def free_port() -> int:
+    """ A TCP port nobody listens on """
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def http_request(port: int, method: str, path: str, headers: dict,
+                 body: str) -> Tuple[int, dict]:
+    """ One request on a new connection, return (status, headers) """
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status, dict(response.getheaders())
+    finally:
+        connection.close()
+
+
+def run_http(service: str, directory: str, users: int, requests: int,
+             concurrency: int, layout: str) -> List[dict]:
+    """ Start the service in its own process and drive it over HTTP """
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-c',
+         'from {} import app; app.run(host="127.0.0.1", port={}, '
+         'threaded=True)'.format(SERVICES[service]['app'], port)],
+        cwd=directory, env=service_env(service, layout),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def benchmark(name, method, path, headers, body):
+        def timed_request(_):
+            t = time.perf_counter()
+            try:
+                status, _ = http_request(port, method, path, headers, body)
+            except OSError:
+                status = 599
+            return time.perf_counter() - t, status >= 400
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            outcomes = list(executor.map(timed_request, range(requests)))
+        return summarize(name, [latency for latency, _ in outcomes],
+                         sum(error for _, error in outcomes),
+                         time.perf_counter() - start)
+
+    def login(endpoint):
+        return session_cookie(http_request(port, *endpoint[1:])[1])
+
+    try:
+        # loading a large .db_User.json takes a while
+        deadline = time.time() + 600
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), 1).close()
+                break
+            except OSError:
+                if server.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("{} didn't start".format(service))
+                time.sleep(0.1)
+        results = run_endpoints(service, users, benchmark, login)
+        max_rss = process_max_rss_mib(server.pid)
+        for result in results:
+            result['max_rss_mib'] = max_rss
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(service: str, mode: str, users: int, requests: int,
+        concurrency: int, layout: str = 'dict') -> List[dict]:
+    """ Populate a fresh store and benchmark a service in a mode """
+    with tempfile.TemporaryDirectory() as directory:
+        if service == 'user_service':
+            populate_sqlite(directory, users)
+        else:
+            populate_models(directory, users)
+        if mode == 'http':
+            results = run_http(service, directory, users, requests,
+                               concurrency, layout)
+        else:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--worker',
+                 '--services', service, '--modes', mode,
+                 '--users', str(users), '--requests', str(requests)],
+                cwd=directory, env=service_env(service, layout), check=True,
+                stdout=subprocess.PIPE).stdout
+            results = json.loads(output)
+    for result in results:
+        result.update({'service': service, 'mode': mode, 'users': users,
+                       'layout': layout,
+                       'concurrency': concurrency if mode == 'http' else 1})
+    return results
+
+
+def git_commit() -> str:
+    """ Commit of the benchmarked tree, None outside of git """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    """ Command line entry point """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--services', nargs='+', choices=list(SERVICES),
+                        default=list(SERVICES))
+    parser.add_argument('--modes', nargs='+',
+                        choices=['in-process', 'http', 'memory'],
+                        default=['in-process', 'http'])
+    parser.add_argument('--layouts', nargs='+', choices=list(LAYOUTS),
+                        default=['dict'],
+                        help="model layouts of 0x01 and 0x02 "
+                        "(COMPACT_MODELS)")
+    parser.add_argument('--users', nargs='+', type=int, default=[1000],
+                        help="table sizes, e.g. 1000 10000 100000 1000000")
+    parser.add_argument('--requests', type=int, default=500,
+                        help="requests per endpoint")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="concurrent HTTP clients")
+    parser.add_argument('--output', help="JSON file, default: stdout")
+    parser.add_argument('--worker', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        if args.modes[0] == 'memory':
+            results = run_memory(args.services[0], args.users[0])
+        else:
+            results = run_in_process(args.services[0], args.users[0],
+                                     args.requests)
+        json.dump(results, sys.stdout)
+        return
+
+    results = []
+    for service in args.services:
+        # 0x03 keeps its users in SQLite: no model layout, no memory mode
+        layouts = ['dict'] if service == 'user_service' else args.layouts
+        modes = [mode for mode in args.modes
+                 if service != 'user_service' or mode != 'memory']
+        for users in args.users:
+            for mode in modes:
+                for layout in layouts:
+                    results.extend(run(service, mode, users, args.requests,
+                                       args.concurrency, layout))
+    report = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()